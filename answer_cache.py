@@ -0,0 +1,172 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 3600.0
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+
+# Words that usually point back at an earlier turn ("what about that one?")
+_FOLLOW_UP_WORDS = frozenset({
+    "it", "its", "that", "this", "these", "those", "they", "them", "their",
+    "he", "she", "him", "her", "above", "previous", "earlier", "again",
+    "else", "also", "more", "same", "one",
+})
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation (keeping hyphenated ids like 13-6) and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s-]", " ", question.lower()).split())
+
+def _identifiers(normalized: str) -> frozenset:
+    # "bco 43" and "bco 42" embed almost identically; never let them share an answer
+    return frozenset(token for token in normalized.split() if any(c.isdigit() for c in token))
+
+def is_follow_up(question: str, chat_history) -> bool:
+    """True when the question probably depends on earlier turns.
+
+    chat_history includes the current question, so a first question is never
+    a follow-up. Later questions count as follow-ups when they are very short
+    or refer back with a pronoun.
+    """
+    if len(chat_history) <= 1:
+        return False
+    words = normalize_question(question).split()
+    return len(words) < 4 or any(word in _FOLLOW_UP_WORDS for word in words)
+
+@dataclass
+class CacheProbe:
+    normalized: str
+    identifiers: frozenset
+    vector: Optional[np.ndarray] = None
+
+@dataclass
+class _Entry:
+    probe: CacheProbe
+    result: dict
+    created_at: float = field(default_factory=time.monotonic)
+
+class SemanticAnswerCache:
+    """Process-wide cache of graph results keyed on the normalized question.
+
+    Lookups match the normalized text exactly first, then fall back to the
+    nearest cached question by cosine similarity of its embedding. Entries
+    expire after ttl_seconds, and the least recently used entry is evicted
+    once max_entries is reached.
+    """
+
+    def __init__(self, embed_query=None, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.embed_query = embed_query
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def probe(self, question: str) -> CacheProbe:
+        normalized = normalize_question(question)
+        return CacheProbe(normalized, _identifiers(normalized))
+
+    def lookup(self, question: str):
+        """Return (cached result or None, probe). Pass the probe to store() on a miss."""
+        probe = self.probe(question)
+        with self._lock:
+            self._expire()
+            if probe.normalized in self._entries:
+                return self._hit(probe.normalized), probe
+
+        # Only pay for an embedding when the exact match misses
+        self._embed(probe)
+        with self._lock:
+            key = self._nearest(probe)
+            if key is None:
+                self.misses += 1
+                return None, probe
+            self.semantic_hits += 1
+            return self._hit(key), probe
+
+    def store(self, probe: CacheProbe, result: dict) -> None:
+        entry = _Entry(probe, {
+            "generation": result.get("generation", ""),
+            "documents": list(result.get("documents", [])),
+            "hallucination_check": dict(result.get("hallucination_check", {})),
+        })
+        with self._lock:
+            self._entries[probe.normalized] = entry
+            self._entries.move_to_end(probe.normalized)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _hit(self, key) -> dict:
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return dict(self._entries[key].result)
+
+    def _embed(self, probe: CacheProbe) -> None:
+        if self.embed_query is None:
+            return
+        try:
+            vector = np.asarray(self.embed_query(probe.normalized), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            probe.vector = vector / norm if norm else None
+        except Exception as e:
+            logger.warning("Answer cache embedding failed, using exact match only: %s", e)
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Insertion order is not creation order after LRU touches, so scan everything
+        expired = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+    def _nearest(self, probe: CacheProbe):
+        if probe.vector is None:
+            return None
+        candidates = [
+            (key, entry.probe.vector) for key, entry in self._entries.items()
+            if entry.probe.vector is not None and entry.probe.identifiers == probe.identifiers
+        ]
+        if not candidates:
+            return None
+        similarities = np.stack([vector for _, vector in candidates]) @ probe.vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        return candidates[best][0]
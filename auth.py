@@ -0,0 +1,47 @@
+import streamlit as st
+from auth_cache import AuthorizationCache, DEFAULT_TTL_SECONDS, DEFAULT_NEGATIVE_TTL_SECONDS
+
+# Shared by the landing page, which logs users in, and the pages that re-check them on every run
+
+@st.cache_resource(show_spinner=False)
+def get_user_table():
+    from astrapy import DataAPIClient
+    client = DataAPIClient(st.secrets['astra']['ASTRA_COLLECTION_USERNAME_TOKEN'])
+    db = client.get_database_by_api_endpoint(st.secrets['astra']['ASTRA_DB_API_ENDPOINT'])
+    return db.get_table(st.secrets['astra']['ASTRA_COLLECTION_USERNAME_DB'])
+
+@st.cache_resource(show_spinner=False)
+def get_authorization_cache(ttl_seconds=DEFAULT_TTL_SECONDS, negative_ttl_seconds=DEFAULT_NEGATIVE_TTL_SECONDS, preload=False):
+    table = get_user_table()
+
+    def lookup_user(email):
+        return table.find_one({'users': email})
+
+    def load_allowlist():
+        return {row['users'] for row in table.find({}, projection={'users': True})}
+
+    return AuthorizationCache(
+        lookup_user,
+        load_allowlist=load_allowlist if preload else None,
+        ttl_seconds=ttl_seconds,
+        negative_ttl_seconds=negative_ttl_seconds,
+    )
+
+def is_authorized_user() -> bool:
+    """Whether the logged-in user is on the allowlist, through the shared authorization cache.
+
+    Revoked users lose access within AUTH_CACHE_TTL_SECONDS. The answer is
+    also kept in st.session_state["authenticated"] for the other pages.
+    """
+    if not getattr(st.user, "is_logged_in", False):
+        authorized = False
+    else:
+        settings = st.secrets.get("rag", {})
+        authorization = get_authorization_cache(
+            ttl_seconds=float(settings.get("AUTH_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            negative_ttl_seconds=float(settings.get("AUTH_CACHE_NEGATIVE_TTL_SECONDS", DEFAULT_NEGATIVE_TTL_SECONDS)),
+            preload=bool(settings.get("AUTH_PRELOAD_ALLOWLIST", False)),
+        )
+        authorized = authorization.is_authorized(getattr(st.user, "email", None))
+    st.session_state["authenticated"] = authorized
+    return authorized
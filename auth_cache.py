@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 300.0
+DEFAULT_NEGATIVE_TTL_SECONDS = 60.0
+
+class AuthorizationCache:
+    """TTL cache in front of the allowlist lookup used at login.
+
+    Positive answers are kept for ttl_seconds, which is also the longest a
+    revoked user keeps access. Negative answers are kept for the shorter
+    negative_ttl_seconds so newly added users get in quickly. When
+    load_allowlist is given, the whole allowlist is loaded in one query and
+    refreshed every ttl_seconds, and single-user lookups are no longer made.
+    """
+
+    def __init__(self, lookup_user, load_allowlist=None, ttl_seconds=DEFAULT_TTL_SECONDS, negative_ttl_seconds=DEFAULT_NEGATIVE_TTL_SECONDS):
+        self.lookup_user = lookup_user
+        self.load_allowlist = load_allowlist
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._entries = {}
+        self._allowlist = None
+        self._allowlist_expires = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+        self.preloads = 0
+
+    def is_authorized(self, email) -> bool:
+        if not email:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+
+        if self.load_allowlist is not None:
+            try:
+                return email in self._current_allowlist(now)
+            except Exception as e:
+                logger.warning("Allowlist preload failed, falling back to single lookup: %s", e)
+
+        authorized = bool(self.lookup_user(email))
+        ttl = self.ttl_seconds if authorized else self.negative_ttl_seconds
+        with self._lock:
+            self.lookups += 1
+            self._entries[email] = (authorized, now + ttl)
+        return authorized
+
+    def invalidate(self, email=None) -> None:
+        """Forget one user, or everything when no email is given."""
+        with self._lock:
+            if email is None:
+                self._entries.clear()
+                self._allowlist = None
+            else:
+                self._entries.pop(email, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "allowlist_size": len(self._allowlist) if self._allowlist is not None else None,
+                "hits": self.hits,
+                "lookups": self.lookups,
+                "preloads": self.preloads,
+            }
+
+    def _current_allowlist(self, now):
+        with self._lock:
+            if self._allowlist is not None and self._allowlist_expires > now:
+                self.hits += 1
+                return self._allowlist
+        allowlist = frozenset(self.load_allowlist())
+        with self._lock:
+            self._allowlist = allowlist
+            self._allowlist_expires = now + self.ttl_seconds
+            self.preloads += 1
+        return allowlist
@@ -0,0 +1,356 @@
+"""Multi-session load test of the Streamlit app against local stand-ins for OpenAI and Astra.
+
+Starts benchmarks/stub_openai.py and benchmarks/stub_astra.py, then drives
+simulated sessions through the real pages with streamlit.testing. Each
+session logs in through app.py and pages/landing.py, asks questions on
+pages/chat.py and searches pages/doc_catalog.py. Sessions run on threads of
+this one process and share st.cache_resource, like sessions on one Streamlit
+worker. Run from the repository root:
+
+    python -m benchmarks.loadtest                       # writes benchmarks/results/loadtest-<commit>.json
+    python -m benchmarks.loadtest --concurrency 1 4 16 --llm-latency 0.5 --llm-error-rate 0.02
+    python -m benchmarks.loadtest --set GRADING_MODE=local --compare benchmarks/results/loadtest-<older>.json
+
+For each concurrency level it reports turn throughput, p50/p95/p99 latency
+of logins, chat turns and catalog searches, failed actions, and RSS growth
+per session (sessions stay open until their level ends, like browser tabs).
+The saturation level is the first whose throughput grows by less than
+--saturation-gain over the previous level, or whose p95 turn latency is
+more than --saturation-factor times that of the first level.
+"""
+import argparse
+import gc
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import MagicMock
+from urllib import parse
+
+import streamlit as st
+from streamlit import config
+from streamlit.logger import set_log_level
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+
+from benchmarks import stub_astra
+from benchmarks.fakes import synthetic_corpus
+from benchmarks.run import RESULTS_DIR, compare, git_commit, summarize
+
+MAIN_SCRIPT = "app.py"
+CATALOG_SEARCHES = ("presbytery", "general assembly", "overture", "minutes", "ordination")
+
+_script_cache = ScriptCache()
+
+class SimulatedSession(AppTest):
+    """One browser session, logged in as user_info, that can run alongside others.
+
+    AppTest swaps the process-wide Streamlit runtime and secrets on every run,
+    so concurrent runs would tear each other's down; simulated sessions share
+    the ones install_runtime() sets up instead.
+    """
+
+    def __init__(self, user_info, timeout):
+        super().__init__(MAIN_SCRIPT, default_timeout=timeout)
+        self.user_info = user_info
+
+    def _run(self, widget_state=None, timeout=None):
+        pages_manager = PagesManager(self._script_path, _script_cache, setup_watcher=False)
+        runner = LocalScriptRunner(self._script_path, self.session_state, pages_manager, args=self.args, kwargs=self.kwargs)
+        # LocalScriptRunner always runs as an anonymous test user
+        runner._user_info = self.user_info
+        self._tree = runner.run(widget_state, self.query_params, timeout or self.default_timeout, self._page_hash)
+        self._tree._runner = self
+        self.query_params = parse.parse_qs(runner.event_data[-1]["client_state"].query_string)
+        return self
+
+    def failure(self):
+        """What went wrong on the last run, or None."""
+        problems = [element.value for element in self.exception] + [element.value for element in self.error]
+        return str(problems[0])[:200] if problems else None
+
+    def turn_failure(self):
+        """Why the last chat turn got no answer, or None.
+
+        Low-confidence answers also show an st.error, so this goes by the
+        turn's message instead: only answers from the pipeline carry references.
+        """
+        if self.exception:
+            return str(self.exception[0].value)[:200]
+        messages = self.session_state["messages"] if "messages" in self.session_state else []
+        if not messages or messages[-1]["role"] != "assistant":
+            return "no answer"
+        if "references" not in messages[-1]:
+            return messages[-1]["content"][:200]
+        return None
+
+def install_runtime(secrets):
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    st.secrets = Secrets()
+    st.secrets._secrets = secrets
+
+def app_secrets(openai_url, astra_url, state_dir, overrides):
+    return {
+        "openai": {
+            "OPENAI_API_KEY": "sk-loadtest",
+            "OPENAI_MODEL": "gpt-4o-mini",
+            "OPENAI_BASE_URL": openai_url,
+            "OPENAI_PROVIDER": "openai",
+            "OPENAI_TEXT_EMBEDDING_MODEL": "text-embedding-3-small",
+        },
+        "astra": {
+            "ASTRA_DB_API_ENDPOINT": astra_url,
+            "ASTRA_DB_APPLICATION_TOKEN": "AstraCS:loadtest",
+            "ASTRA_DB_KEYSPACE": "default_keyspace",
+            "ASTRA_COLLECTION_NAME": "chunks",
+            "ASTRA_DB_API_KEY_NAME": "openai",
+            "ASTRA_COLLECTION_USERNAME_TOKEN": "AstraCS:loadtest",
+            "ASTRA_COLLECTION_USERNAME_DB": stub_astra.USERS_TABLE,
+            "ASTRA_QUERY_DB": "queries",
+        },
+        # Everything the app writes to disk goes to a scratch directory
+        "rag": {
+            "CHECKPOINT_DB_PATH": os.path.join(state_dir, "checkpoints.sqlite3"),
+            "TRACE_DB_PATH": os.path.join(state_dir, "traces.sqlite3"),
+            "QUERY_LOG_SPILL_PATH": os.path.join(state_dir, "query_log_spill.jsonl"),
+            "BM25_INDEX_PATH": os.path.join(state_dir, "bm25"),
+            **overrides,
+        },
+    }
+
+def parse_setting(assignment):
+    """KEY=VALUE with a TOML value (true, 0.5, "text"); anything else is a plain string."""
+    key, _, value = assignment.partition("=")
+    try:
+        return key, tomllib.loads(f"value = {value}")["value"]
+    except tomllib.TOMLDecodeError:
+        return key, value
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Peak rather than current, but still only grows with the sessions
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def user_info(level, number):
+    return {"email": f"loadtest-{level}-{number}@example.org", "name": f"Load Test {number}", "is_logged_in": True}
+
+def run_session(session, questions, catalog_search, think_time, record):
+    """Log in, ask the questions and search the catalog; record(kind, ms, failure) per action."""
+
+    def act(kind, run, check=session.failure):
+        start = time.perf_counter()
+        try:
+            run()
+            failure = check()
+        except Exception as e:
+            failure = f"{type(e).__name__}: {e}"[:200]
+        record(kind, (time.perf_counter() - start) * 1000, failure)
+        time.sleep(think_time)
+        return failure is None
+
+    # app.py sends everyone through the landing page's allowlist check to the chat page
+    if not act("login", session.run) or not session.chat_input:
+        return
+    # Stay on the chat page from now on, as the browser does after the switch
+    session.switch_page("pages/chat.py")
+    for question in questions:
+        # Users ask again after a failed turn, so the session carries on
+        act("turn", lambda: session.chat_input[0].set_value(question).run(), session.turn_failure)
+    session.switch_page("pages/doc_catalog.py")
+    if act("catalog", session.run):
+        act("catalog", lambda: session.text_input[0].input(catalog_search).run())
+    session.switch_page("pages/chat.py")
+
+class LevelRecorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.failures = {}
+
+    def __call__(self, kind, ms, failure):
+        with self.lock:
+            self.samples.setdefault(kind, []).append(ms)
+            if failure is not None:
+                self.failures.setdefault(kind, []).append(failure)
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def run_level(level, concurrency, questions, args):
+    sessions = [SimulatedSession(user_info(level, i), args.timeout) for i in range(concurrency)]
+    assignments = [[next(questions) for _ in range(args.turns)] for _ in sessions]
+    recorder = LevelRecorder()
+    gc.collect()
+    rss_before, cpu_before = rss_mb(), cpu_seconds()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="session") as pool:
+        futures = [
+            pool.submit(run_session, session, assigned, CATALOG_SEARCHES[i % len(CATALOG_SEARCHES)], args.think_time, recorder)
+            for i, (session, assigned) in enumerate(zip(sessions, assignments))
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+    cpu = cpu_seconds() - cpu_before
+    # Sessions are still referenced, so what they hold on to is still counted
+    gc.collect()
+    rss_after = rss_mb()
+
+    results = {}
+    for kind, samples in recorder.samples.items():
+        failures = recorder.failures.get(kind, [])
+        results[f"{kind}[c={concurrency}]"] = {
+            **summarize(samples),
+            "failed": len(failures),
+            "failure_examples": sorted(set(failures))[:3],
+        }
+    turns = results.setdefault(f"turn[c={concurrency}]", {**summarize([0.0]), "n": 0, "failed": 0, "failure_examples": []})
+    turns.update({
+        "throughput_turns_per_s": (turns["n"] - turns["failed"]) / elapsed,
+        "elapsed_s": elapsed,
+        # 1.0 is one core; with the GIL, a Streamlit worker can't use much more
+        "cpu_utilization": cpu / elapsed,
+        "rss_growth_per_session_mb": (rss_after - rss_before) / concurrency,
+    })
+    return results
+
+def saturation(levels, gain, factor):
+    """The first concurrency level past the point where adding sessions stops paying off, or None."""
+    baseline = levels[0]
+    for previous, level in zip(levels, levels[1:]):
+        if level["throughput_turns_per_s"] < previous["throughput_turns_per_s"] * (1 + gain):
+            return level["concurrency"]
+        if level["p95_ms"] > factor * baseline["p95_ms"]:
+            return level["concurrency"]
+    return None
+
+def start_stub(module, *options):
+    """Run a stub server in its own process, so its work isn't counted as the app's; returns (process, url)."""
+    process = subprocess.Popen([sys.executable, "-m", module, "--port", "0", *map(str, options)], stdout=subprocess.PIPE, text=True)
+    ready = process.stdout.readline()
+    if not ready:
+        raise RuntimeError(f"{module} exited with {process.wait()} before serving")
+    return process, ready.split()[-1]
+
+def drain_background_work():
+    """Let the app finish its background writes while the stubs and scratch files still exist."""
+    # Script runs execute pages as __main__, which is part of every st.cache_resource key
+    spec = importlib.util.spec_from_file_location("__main__", os.path.join("pages", "chat.py"))
+    chat = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(chat)
+    chat.get_query_writer().flush(timeout=30)
+    chat.get_background_executor().shutdown(wait=True)
+    st.cache_resource.clear()
+
+def run(args):
+    # Parsing the config resets log levels, so it goes first; new sessions would each warn about running outside a script
+    config.get_config_options()
+    set_log_level("error")
+    _, queries = synthetic_corpus(n_chunks=args.corpus_size)
+    # Distinct questions everywhere, so the answer cache only helps as much as it would in production
+    questions = itertools.cycle(query["question"] for query in queries)
+    plan = ([(0, args.warmup)] if args.warmup else []) + list(enumerate(args.concurrency, start=1))
+    users = [user_info(level, i)["email"] for level, concurrency in plan for i in range(concurrency)]
+    stubs = []
+    results, levels = {}, []
+    try:
+        openai, openai_url = start_stub(
+            "benchmarks.stub_openai", "--latency", args.llm_latency, "--error-rate", args.llm_error_rate, "--rate-limit-every", args.rate_limit_every,
+        )
+        stubs.append(openai)
+        astra, astra_url = start_stub(
+            "benchmarks.stub_astra", "--latency", args.astra_latency, "--error-rate", args.astra_error_rate, "--corpus-size", args.corpus_size,
+            *(option for email in users for option in ("--user", email)),
+        )
+        stubs.append(astra)
+        with tempfile.TemporaryDirectory(prefix="loadtest-") as state_dir:
+            install_runtime(app_secrets(openai_url, astra_url, state_dir, dict(parse_setting(assignment) for assignment in args.set)))
+            with patch_config_options({"global.appTest": True}):
+                for level, concurrency in plan:
+                    level_results = run_level(level, concurrency, questions, args)
+                    # Level 0 is the cold start (imports, cached resources), which no level should pay for
+                    if level == 0:
+                        continue
+                    results.update(level_results)
+                    turn = level_results[f"turn[c={concurrency}]"]
+                    levels.append({"concurrency": concurrency, **turn})
+                    print(
+                        f"c={concurrency:<4} {turn['throughput_turns_per_s']:>7.2f} turns/s  "
+                        f"p50 {turn['p50_ms']:>8.0f}ms  p95 {turn['p95_ms']:>8.0f}ms  p99 {turn['p99_ms']:>8.0f}ms  "
+                        f"failed {turn['failed']:>3}  cpu {turn['cpu_utilization']:.2f}  +{turn['rss_growth_per_session_mb']:.1f}MB/session"
+                    )
+                drain_background_work()
+    finally:
+        for stub in stubs:
+            stub.terminate()
+            stub.wait()
+        Runtime._instance = None
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "saturation_concurrency": saturation(levels, args.saturation_gain, args.saturation_factor) if levels else None,
+        "results": results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="simultaneous sessions per level")
+    parser.add_argument("--turns", type=int, default=3, help="questions per session")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds a session pauses between actions")
+    parser.add_argument("--warmup", type=int, default=1, help="sessions run before the first level, untimed")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds before a script run counts as hung")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per stub OpenAI request")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of OpenAI requests answered with a 500")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth OpenAI request with a 429")
+    parser.add_argument("--astra-latency", type=float, default=0.05, help="seconds per stub Data API request")
+    parser.add_argument("--astra-error-rate", type=float, default=0.0, help="share of Data API requests answered with a 503")
+    parser.add_argument("--corpus-size", type=int, default=500)
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="[rag] setting for the app, e.g. GRADING_MODE=local")
+    parser.add_argument("--saturation-gain", type=float, default=0.1, help="smallest throughput gain per level that still counts as scaling")
+    parser.add_argument("--saturation-factor", type=float, default=3.0, help="p95 turn latency, relative to the first level, that counts as saturated")
+    parser.add_argument("--out", help="results file (default: benchmarks/results/loadtest-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    out = args.out or os.path.join(RESULTS_DIR, f"loadtest-{report['commit']}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}")
+    saturated = report["saturation_concurrency"]
+    print(f"Saturates at {saturated} concurrent sessions" if saturated else "No saturation within the levels tried")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
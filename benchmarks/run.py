@@ -0,0 +1,305 @@
+"""Offline benchmarks for the chat pipeline.
+
+Builds the real graph from pages/chat.py on top of the fakes in
+benchmarks/fakes.py, so no OpenAI or Astra credentials are needed. Run from
+the repository root:
+
+    python -m benchmarks.run                      # writes benchmarks/results/<commit>.json
+    python -m benchmarks.run --compare benchmarks/results/<older>.json
+"""
+import argparse
+import importlib.util
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+from langchain_core.prompts import ChatPromptTemplate
+
+from bm25 import BM25Index, HybridRetriever
+from grading import grade_concurrently
+from references import ChunkTextCache
+from reranker import LocalReranker
+from speculation import SPECULATION_MODES
+from tracing import NodeUsage
+from benchmarks.fakes import FakeChatModel, FakeRetriever, synthetic_corpus
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+def load_chat_page():
+    """Import pages/chat.py as a module without rendering it (no session is authenticated)."""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    if "." not in sys.path:
+        sys.path.insert(0, ".")
+    spec = importlib.util.spec_from_file_location("chat_page", os.path.join("pages", "chat.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def build_graph(chat, llm, retriever, **kwargs):
+    # Bypass st.cache_resource so every configuration gets a fresh graph
+    return chat.create_agentic_rag_chain.__wrapped__(llm, retriever, **kwargs)
+
+def measure(fn, repeat, warmup=1):
+    """Milliseconds per call for `repeat` calls after `warmup` untimed ones."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+def summarize(samples):
+    ordered = sorted(samples)
+    def pct(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "n": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "min_ms": ordered[0],
+        "max_ms": ordered[-1],
+    }
+
+def graph_inputs(question):
+    return {"question": question, "chat_history": [], "documents": [], "generation": "", "routing": {}, "hallucination_check": {}, "metrics": {}, "budget": {}}
+
+def bench_end_to_end(chat, corpus, queries, args):
+    llm = FakeChatModel(latency=args.llm_latency)
+    retriever = FakeRetriever(corpus, latency=args.retriever_latency)
+    results = {}
+    variants = [(grading_mode, "off", "router") for grading_mode in ("concurrent", "batched", "local")]
+    variants += [("concurrent", speculative_mode, "router") for speculative_mode in args.speculative_modes if speculative_mode != "off"]
+    variants += [("concurrent", "off", "planner")]
+    for grading_mode, speculative_mode, topology in variants:
+        graph = build_graph(chat, llm, retriever, grading_mode=grading_mode, speculative_mode=speculative_mode, topology=topology, prerouter_enabled=True)
+        name = grading_mode if speculative_mode == "off" else f"{grading_mode},speculative={speculative_mode}"
+        if topology != "router":
+            name += f",topology={topology}"
+        # Same question sequence for every measurement so runs stay comparable
+        questions = itertools.cycle(query["question"] for query in queries[:args.repeat + 1])
+        usage = NodeUsage()
+        results[f"end_to_end[{name}]"] = measure(lambda: graph.invoke(graph_inputs(next(questions)), {"callbacks": [usage]}), args.repeat)
+        # Includes the warmup call
+        results[f"end_to_end[{name}]"].update({
+            "llm_calls_per_request": usage.llm_calls / (args.repeat + 1),
+            "prompt_tokens_per_request": usage.prompt_tokens / (args.repeat + 1),
+            "completion_tokens_per_request": usage.completion_tokens / (args.repeat + 1),
+        })
+
+        def first_token():
+            # Stops at the first streamed answer token
+            for token in chat.stream_generation(graph, graph_inputs(next(questions)), {}):
+                if token:
+                    break
+        questions = itertools.cycle(query["question"] for query in queries[:args.repeat + 1])
+        results[f"first_token[{name}]"] = measure(first_token, args.repeat)
+    return results
+
+def bench_grading(chat, corpus, queries, args):
+    llm = FakeChatModel(latency=args.llm_latency)
+    retriever = FakeRetriever(corpus, k=max(args.k_values))
+    results = {}
+    for k in args.k_values:
+        query = queries[0]["question"]
+        documents = retriever.invoke(query)[:k]
+        state = {"question": query, "documents": documents, "chat_history": [], "metrics": {}, "budget": {}}
+        for mode in ("concurrent", "batched", "local"):
+            results[f"grade_and_rank_documents[{mode},k={k}]"] = measure(
+                lambda: chat.grade_and_rank_documents(state, llm, mode=mode), args.repeat
+            )
+    results.update(grading_quality(chat, llm, retriever, queries[:args.recall_queries]))
+    return results
+
+def grading_quality(chat, llm, retriever, queries):
+    """Latency per query of the fake LLM grader and the local reranker on the same candidates.
+
+    Both are scored against the synthetic corpus labels (each query's
+    "relevant" chunk ids): the share of relevant chunks each keeps (recall),
+    and the share of kept chunks that are relevant (precision). FakeChatModel
+    grades by word overlap, so its row is a baseline, not a stand-in for a
+    real LLM's judgement.
+    """
+    grader = ChatPromptTemplate.from_template("Document: {document}\nQuestion: {question}\n") | llm.with_structured_output(chat.GradeDocuments)
+    reranker = LocalReranker()
+    times = {"llm": [], "local": []}
+    counts = {name: {"kept": 0, "kept_relevant": 0, "relevant": 0} for name in times}
+    total = 0
+    for query in queries:
+        documents = retriever.invoke(query["question"])
+        start = time.perf_counter()
+        llm_grades = grade_concurrently(grader, [{"document": doc.page_content, "question": query["question"]} for doc in documents])
+        times["llm"].append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        local_grades = reranker.grade(query["question"], documents)
+        times["local"].append((time.perf_counter() - start) * 1000)
+        for doc, llm_grade, local_grade in zip(documents, llm_grades, local_grades):
+            relevant = doc.metadata["chunk_id"] in query["relevant"]
+            for name, grade in (("llm", llm_grade), ("local", local_grade)):
+                # Same rule grade_and_rank_documents applies
+                kept = grade is not None and grade.score == "yes" and grade.relevance_score > 0.3
+                counts[name]["kept"] += kept
+                counts[name]["kept_relevant"] += kept and relevant
+                counts[name]["relevant"] += relevant
+            total += 1
+    results = {}
+    for name, count in counts.items():
+        results[f"grading_quality[{name}]"] = {
+            **summarize(times[name]),
+            "recall": count["kept_relevant"] / count["relevant"] if count["relevant"] else 0.0,
+            "precision": count["kept_relevant"] / count["kept"] if count["kept"] else 0.0,
+            "kept_share": count["kept"] / total if total else 0.0,
+        }
+    return results
+
+def bench_diversity(chat, args):
+    rng = random.Random(0)
+    results = {}
+    for chunk_chars in args.chunk_sizes:
+        corpus, queries = synthetic_corpus(n_chunks=max(args.k_values), chunk_chars=chunk_chars, seed=1)
+        vectors = np.random.default_rng(0).normal(size=(len(corpus), 1536))
+        for k in args.k_values:
+            for method in ("jaccard", "mmr"):
+                def candidates():
+                    # Fresh dicts each call; jaccard caches tokens on the candidate
+                    return [
+                        {"doc": doc, "score": rng.random(), "reasoning": "", "embedding": vectors[i]}
+                        for i, doc in enumerate(corpus[:k])
+                    ]
+                results[f"apply_diversity_filter[{method},k={k},chars={chunk_chars}]"] = measure(
+                    lambda: chat.apply_diversity_filter(candidates(), queries[0]["question"], method=method), args.repeat
+                )
+    return results
+
+def recall(retriever, queries, k):
+    hits = sum(bool(query["relevant"] & {doc.metadata["chunk_id"] for doc in retriever.invoke(query["question"])[:k]}) for query in queries)
+    return hits / len(queries)
+
+def bench_hybrid(corpus, queries, args):
+    """Retrieval recall and latency, vector-only against BM25 fused with vector search."""
+    vector = FakeRetriever(corpus, latency=args.retriever_latency)
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        BM25Index.build(corpus, path, catalog={})
+        build_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        index = BM25Index.load(path)
+        load_ms = (time.perf_counter() - start) * 1000
+        hybrid = HybridRetriever(vector, index, k=15)
+        sample = queries[:args.recall_queries]
+        results = {}
+        for name, retriever in (("vector", vector), ("hybrid", hybrid)):
+            questions = itertools.cycle(query["question"] for query in sample)
+            results[f"retrieval[{name}]"] = {
+                **measure(lambda: retriever.invoke(next(questions)), args.repeat),
+                **{f"recall@{k}": recall(retriever, sample, k) for k in (5, 15)},
+            }
+        questions = itertools.cycle(query["question"] for query in sample)
+        results["bm25_search"] = {
+            **measure(lambda: index.search(next(questions), 15), args.repeat),
+            "build_ms": build_ms,
+            "load_ms": load_ms,
+            "chunks": len(corpus),
+        }
+        results["retrieval[hybrid]"]["lexical_only_docs"] = hybrid.stats()["lexical_only_docs"]
+    return results
+
+def bench_references(chat, corpus, args):
+    results = {}
+    chunk_cache = ChunkTextCache()
+    for n in (8, 30):
+        references = chunk_cache.add_documents(corpus[:n])
+        results[f"render_references[n={n}]"] = measure(lambda: chat.render_references(references, key=n), args.repeat)
+    # A rerun redraws every past turn
+    turns = [chunk_cache.add_documents(corpus[i * 8:(i + 1) * 8]) for i in range(20)]
+    def rerender():
+        for turn, references in enumerate(turns):
+            chat.render_references(references, key=turn)
+    results["render_history[turns=20]"] = measure(rerender, args.repeat)
+    return results
+
+BENCHMARKS = ("end_to_end", "grading", "diversity", "hybrid", "references")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run(args):
+    chat = load_chat_page()
+    corpus, queries = synthetic_corpus(n_chunks=args.corpus_size, chunk_chars=args.chunk_chars)
+    results = {}
+    if "end_to_end" in args.only:
+        results.update(bench_end_to_end(chat, corpus, queries, args))
+    if "grading" in args.only:
+        results.update(bench_grading(chat, corpus, queries, args))
+    if "diversity" in args.only:
+        results.update(bench_diversity(chat, args))
+    if "hybrid" in args.only:
+        results.update(bench_hybrid(corpus, queries, args))
+    if "references" in args.only:
+        results.update(bench_references(chat, corpus, args))
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "results": results,
+    }
+
+def compare(current, baseline):
+    print(f"{'benchmark':<60} {'baseline p50':>13} {'current p50':>12} {'change':>8}")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<60} {'-':>13} {result['p50_ms']:>10.2f}ms {'new':>8}")
+            continue
+        change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0.0
+        print(f"{name:<60} {before['p50_ms']:>11.2f}ms {result['p50_ms']:>10.2f}ms {change:>+7.1f}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--retriever-latency", type=float, default=0.1, help="seconds per fake vector search")
+    parser.add_argument("--corpus-size", type=int, default=500)
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    parser.add_argument("--speculative-modes", nargs="+", choices=SPECULATION_MODES, default=list(SPECULATION_MODES))
+    parser.add_argument("--recall-queries", type=int, default=100, help="queries used for retrieval recall")
+    parser.add_argument("--k-values", type=int, nargs="+", default=[5, 15, 50])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[500, 2000, 8000])
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    else:
+        for name, result in report["results"].items():
+            print(f"{name:<60} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Minimal Astra Data API server for exercising astrapy and langchain-astradb offline.
+
+Serves the commands the app sends: vector search ($vectorize sort) and _id
+lookups on the chunk collection, backed by the synthetic corpus from
+benchmarks/fakes.py, plus findOne/find/insertOne/insertMany on tables (the
+user allowlist and the query log). Point the app at it with
+ASTRA_DB_API_ENDPOINT = "http://127.0.0.1:8090" under [astra].
+
+    python -m benchmarks.stub_astra --port 8090 --latency 0.1 --error-rate 0.01 --user me@example.org
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from benchmarks.fakes import FakeRetriever, synthetic_corpus
+from benchmarks.stub_openai import StubServer
+
+USERS_TABLE = "users"
+
+def _chunk_document(doc, similarity=None):
+    document = {"_id": str(doc.metadata["chunk_id"]), "$vectorize": doc.page_content, "metadata": doc.metadata}
+    if similarity is not None:
+        document["$similarity"] = similarity
+    return document
+
+def _schema(rows):
+    # Tables describe the returned columns; astrapy rejects rows with undescribed ones
+    return {column: {"type": "text"} for row in rows for column in row}
+
+def _matches(row, filter):
+    return all(row.get(key) == value for key, value in (filter or {}).items())
+
+class AstraState:
+    def __init__(self, documents, users=(), latency=0.0, error_rate=0.0, seed=0):
+        self.retriever = FakeRetriever(documents, score_threshold=0.0)
+        self.by_id = {str(doc.metadata["chunk_id"]): doc for doc in documents}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.tables = {USERS_TABLE: [{"users": email} for email in users]}
+
+    def count(self):
+        """Count a request; True when it should fail."""
+        with self.lock:
+            self.requests += 1
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def rows(self, name):
+        with self.lock:
+            return list(self.tables.get(name, ()))
+
+    def insert(self, name, rows):
+        with self.lock:
+            self.tables.setdefault(name, []).extend(rows)
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            failed = state.count()
+            time.sleep(state.latency)
+            if failed:
+                self._json(503, {"errors": [{"message": "Simulated Data API failure", "errorCode": "SERVER_UNAVAILABLE"}]})
+                return
+            name = self.path.rstrip("/").split("/")[-1]
+            command, payload = next(iter(body.items()), ("", None))
+            payload = payload or {}
+            handler = getattr(self, f"_{command}", None)
+            if handler is None:
+                self._json(200, {"status": {"ok": 1}})
+            else:
+                self._json(200, handler(name, payload))
+
+        def _find(self, name, payload):
+            sort, filter = payload.get("sort") or {}, payload.get("filter") or {}
+            limit = (payload.get("options") or {}).get("limit") or 20
+            if "$vectorize" in sort:
+                scored = state.retriever.similarity_search_with_relevance_scores(sort["$vectorize"], k=limit)
+                documents = [_chunk_document(doc, similarity) for doc, similarity in scored]
+            elif "_id" in filter:
+                doc = state.by_id.get(str(filter["_id"]))
+                documents = [_chunk_document(doc)] if doc is not None else []
+            else:
+                documents = [row for row in state.rows(name) if _matches(row, filter)][:limit]
+            return {"data": {"documents": documents, "nextPageState": None}, "status": {"projectionSchema": _schema(documents)}}
+
+        def _findOne(self, name, payload):
+            found = self._find(name, {**payload, "options": {"limit": 1}})
+            documents = found["data"]["documents"]
+            return {"data": {"document": documents[0] if documents else None}, "status": found["status"]}
+
+        def _insertMany(self, name, payload):
+            rows = payload.get("documents") or []
+            state.insert(name, rows)
+            ids = [[row.get("query_id", row.get("_id"))] for row in rows]
+            return {"status": {
+                "primaryKeySchema": {"query_id": {"type": "text"}},
+                "insertedIds": ids,
+                "documentResponses": [{"_id": key, "status": "OK"} for key in ids],
+            }}
+
+        def _insertOne(self, name, payload):
+            return self._insertMany(name, {"documents": [payload.get("document") or {}]})
+
+    return Handler
+
+def serve(port=8090, latency=0.0, error_rate=0.0, users=(), documents=None):
+    """Start the stub on a background thread; returns (server, state)."""
+    if documents is None:
+        documents, _ = synthetic_corpus()
+    state = AstraState(documents, users, latency, error_rate)
+    server = StubServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, name="stub-astra", daemon=True).start()
+    return server, state
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--corpus-size", type=int, default=500)
+    parser.add_argument("--user", action="append", default=[], help="email to put in the allowlist table")
+    args = parser.parse_args(argv)
+    documents, _ = synthetic_corpus(args.corpus_size)
+    server, _ = serve(args.port, args.latency, args.error_rate, args.user, documents)
+    print(f"Stub Astra Data API on http://127.0.0.1:{server.server_port}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
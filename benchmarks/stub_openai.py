@@ -0,0 +1,173 @@
+"""Minimal OpenAI-compatible HTTP server for exercising the real client stack offline.
+
+Serves /v1/chat/completions (plain, streamed, JSON-schema and tool-call
+structured output) and /v1/embeddings with fixed latency, answering a
+share of requests with 500s when error_rate is set. Point the app at it with OPENAI_BASE_URL = "http://127.0.0.1:8089/v1" under [openai].
+
+    python -m benchmarks.stub_openai --port 8089 --latency 0.2 --rate-limit-every 50 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMENSIONS = 64
+
+def _example(schema, definitions):
+    """A value satisfying a JSON schema, good enough for pydantic to parse."""
+    if "$ref" in schema:
+        return _example(definitions[schema["$ref"].split("/")[-1]], definitions)
+    if "anyOf" in schema:
+        return _example(schema["anyOf"][0], definitions)
+    kind = schema.get("type")
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind == "object":
+        return {name: _example(prop, definitions) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return []
+    if kind == "boolean":
+        return True
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 0.8
+    return "yes"
+
+def _structured(schema):
+    return json.dumps(_example(schema, schema.get("$defs", {})))
+
+def _embedding(text):
+    digest = hashlib.sha256(text.encode()).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(EMBEDDING_DIMENSIONS)]
+
+class StubState:
+    def __init__(self, latency=0.0, rate_limit_every=0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+    def fail(self):
+        """True for the share of requests that should get a server error."""
+        with self.lock:
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status, payload, headers=()):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            number = state.count()
+            if state.rate_limit_every and number % state.rate_limit_every == 0:
+                self._json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}, [("Retry-After", "1")])
+                return
+            time.sleep(state.latency)
+            if state.fail():
+                self._json(500, {"error": {"message": "Simulated server error", "type": "server_error"}})
+                return
+            if self.path.endswith("/embeddings"):
+                inputs = body.get("input")
+                inputs = inputs if isinstance(inputs, list) else [inputs]
+                data = [{"object": "embedding", "index": i, "embedding": _embedding(str(text))} for i, text in enumerate(inputs)]
+                self._json(200, {"object": "list", "data": data, "model": body.get("model"), "usage": {"prompt_tokens": 8, "total_tokens": 8}})
+            elif self.path.endswith("/chat/completions"):
+                self._chat(body)
+            else:
+                self._json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        def _chat(self, body):
+            prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+            message = {"role": "assistant", "content": "This is a stubbed answer based on the Book of Church Order."}
+            response_format = body.get("response_format") or {}
+            if response_format.get("type") == "json_schema":
+                message["content"] = _structured(response_format["json_schema"]["schema"])
+            elif body.get("tools"):
+                function = body["tools"][0]["function"]
+                message["content"] = None
+                message["tool_calls"] = [{"id": "call_stub", "type": "function", "function": {"name": function["name"], "arguments": _structured(function.get("parameters", {}))}}]
+            completion_tokens = len((message["content"] or "").split()) or 10
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+            base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": body.get("model", "stub")}
+            if not body.get("stream"):
+                choice = {"index": 0, "message": message, "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}
+                self._json(200, {**base, "object": "chat.completion", "choices": [choice], "usage": usage})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            chunks = [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]
+            chunks += [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None} for word in (message["content"] or "").split()]
+            chunks += [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            events = [{**base, "object": "chat.completion.chunk", "choices": [choice]} for choice in chunks]
+            if (body.get("stream_options") or {}).get("include_usage"):
+                events.append({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+            for event in events:
+                self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+
+        def _chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is normal
+        pass
+
+def serve(port=8089, latency=0.0, rate_limit_every=0, error_rate=0.0):
+    """Start the stub on a background thread; returns (server, state)."""
+    state = StubState(latency, rate_limit_every, error_rate)
+    server = StubServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, name="stub-openai", daemon=True).start()
+    return server, state
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per request")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    args = parser.parse_args(argv)
+    server, _ = serve(args.port, args.latency, args.rate_limit_every, args.error_rate)
+    print(f"Stub OpenAI API on http://127.0.0.1:{server.server_port}/v1", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
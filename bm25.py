@@ -0,0 +1,284 @@
+"""Local BM25 index over the ingested chunks, fused with vector search.
+
+Build the index from the Astra collection (or a JSON-lines export of chunks)
+joined with the document catalog:
+
+    python -m bm25 build --out indexes/bm25
+    python -m bm25 build --chunks chunks.jsonl --out indexes/bm25
+
+The index is a directory of NumPy arrays plus a JSON-lines document store;
+everything is memory-mapped on load, so opening it is cheap and the pages
+are shared between processes.
+"""
+import argparse
+import csv
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.documents import Document
+
+from diversity import retrieve_with_embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = "indexes/bm25"
+CATALOG_PATH = "notebooks/files/pdf_metadata.csv"
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+DEFAULT_RRF_K = 60
+FORMAT_VERSION = 1
+
+# "BCO 13-6", "SJC 2019-07" and "Overture 23" must survive tokenization intact
+_TOKEN = re.compile(r"\d+(?:-\d+)+|\w+")
+_DASHES = re.compile(r"[‐-―]")
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how in is it of on or that the this to was what when where
+which who why will with does do say says about
+""".split())
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(_DASHES.sub("-", text.lower())) if token not in _STOPWORDS]
+
+def load_catalog(path=CATALOG_PATH):
+    """Catalog rows keyed by pdf_url, which ingestion stores as metadata['author']."""
+    try:
+        with open(path, newline="") as f:
+            return {row["pdf_url"]: row for row in csv.DictReader(f) if row.get("pdf_url")}
+    except OSError as e:
+        logger.warning("Document catalog %s unavailable: %s", path, e)
+        return {}
+
+def _indexed_text(doc, catalog):
+    row = catalog.get(doc.metadata.get("author", ""), {})
+    title = doc.metadata.get("title") or row.get("title", "")
+    return " ".join(part for part in (title, row.get("filename", ""), doc.page_content) if part)
+
+class BM25Index:
+    """Okapi BM25 over a CSR postings layout; search cost scales with the query's postings, not the corpus."""
+
+    def __init__(self, path, meta, offsets, postings_doc, postings_tf, idf, doc_norm, doc_offsets):
+        self.path = path
+        self.vocabulary = meta["vocabulary"]
+        self.k1 = meta["k1"]
+        self.n_docs = meta["n_docs"]
+        self.offsets = offsets
+        self.postings_doc = postings_doc
+        self.postings_tf = postings_tf
+        self.idf = idf
+        self.doc_norm = doc_norm
+        self.doc_offsets = doc_offsets
+        self._docs_file = open(os.path.join(path, "docs.jsonl"), "rb")
+        self._docs = mmap.mmap(self._docs_file.fileno(), 0, access=mmap.ACCESS_READ) if self.n_docs else b""
+
+    @classmethod
+    def build(cls, documents, path, catalog=None, k1=DEFAULT_K1, b=DEFAULT_B):
+        """Index documents, write the index to path and return it loaded."""
+        catalog = catalog if catalog is not None else load_catalog()
+        os.makedirs(path, exist_ok=True)
+        vocabulary, postings = {}, []
+        lengths, doc_offsets = [], []
+        with open(os.path.join(path, "docs.jsonl"), "wb") as docs_file:
+            for doc_id, doc in enumerate(documents):
+                counts = Counter(tokenize(_indexed_text(doc, catalog)))
+                lengths.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    term_id = vocabulary.setdefault(term, len(vocabulary))
+                    postings.append((term_id, doc_id, tf))
+                doc_offsets.append(docs_file.tell())
+                record = {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}
+                docs_file.write(json.dumps(record, ensure_ascii=False).encode() + b"\n")
+
+        n_docs = len(lengths)
+        postings = np.array(postings, dtype=np.int64).reshape(-1, 3)
+        postings = postings[np.lexsort((postings[:, 1], postings[:, 0]))]
+        doc_freq = np.bincount(postings[:, 0], minlength=len(vocabulary))
+        offsets = np.concatenate(([0], np.cumsum(doc_freq))).astype(np.int64)
+        lengths = np.array(lengths, dtype=np.float32)
+        avgdl = float(lengths.mean()) if n_docs and lengths.any() else 1.0
+        arrays = {
+            "offsets": offsets,
+            "postings_doc": postings[:, 1].astype(np.int32),
+            "postings_tf": postings[:, 2].astype(np.float32),
+            "idf": np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32),
+            # Length normalisation is fixed per document, so it is computed once here
+            "doc_norm": (k1 * (1 - b + b * lengths / avgdl)).astype(np.float32),
+            "doc_offsets": np.array(doc_offsets, dtype=np.int64),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+        meta = {"version": FORMAT_VERSION, "k1": k1, "b": b, "n_docs": n_docs, "avgdl": avgdl, "vocabulary": vocabulary}
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        logger.info("Built BM25 index of %d chunks and %d terms in %s", n_docs, len(vocabulary), path)
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"BM25 index at {path} has format {meta.get('version')}, expected {FORMAT_VERSION}; rebuild it")
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ("offsets", "postings_doc", "postings_tf", "idf", "doc_norm", "doc_offsets")
+        }
+        return cls(path, meta, **arrays)
+
+    def search(self, query, k=15):
+        """Top-k (document position, score) pairs, best first."""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end]
+            # Each document appears once per term, so fancy-index addition is safe
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self.doc_norm[docs])
+        if not self.n_docs:
+            return []
+        k = min(k, self.n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    def document(self, position):
+        start = int(self.doc_offsets[position])
+        record = json.loads(self._docs[start:self._docs.find(b"\n", start)])
+        return Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+
+    def invoke(self, query, k=15):
+        return [self.document(position) for position, _ in self.search(query, k)]
+
+def document_key(doc):
+    return doc.id or (doc.metadata.get("author"), doc.metadata.get("page"), doc.page_content)
+
+def reciprocal_rank_fusion(ranked_lists, k=15, rrf_k=DEFAULT_RRF_K):
+    """Merge ranked document lists; a document's score is the sum of 1 / (rrf_k + rank)."""
+    scores, docs = {}, {}
+    for ranked in ranked_lists:
+        for rank, doc in enumerate(ranked, start=1):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ordered[:k]]
+
+class HybridRetriever:
+    """Runs vector search and BM25 in parallel and fuses them with reciprocal-rank fusion."""
+
+    def __init__(self, retriever, index: BM25Index, k=15, lexical_k=15, rrf_k=DEFAULT_RRF_K, max_workers=4):
+        self.retriever = retriever
+        self.index = index
+        self.k = k
+        self.lexical_k = lexical_k
+        self.rrf_k = rrf_k
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vector-search")
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._lexical_only = 0
+        self._lexical_seconds = 0.0
+
+    @property
+    def vectorstore(self):
+        # Callers that need raw vectors (MMR) reach the store through the dense retriever
+        return getattr(self.retriever, "vectorstore", None)
+
+    @property
+    def search_kwargs(self):
+        return getattr(self.retriever, "search_kwargs", {})
+
+    def invoke(self, query, config=None, **kwargs):
+        vector_future = self._executor.submit(self.retriever.invoke, query)
+        lexical, lexical_seconds = self._lexical(query)
+        return self._fuse(vector_future.result(), lexical, lexical_seconds)
+
+    def invoke_with_embeddings(self, query):
+        """Fused results plus the dense vectors, aligned with them; BM25-only documents get None."""
+        vector_future = self._executor.submit(retrieve_with_embeddings, self.retriever, query)
+        lexical, lexical_seconds = self._lexical(query)
+        vector, embeddings = vector_future.result()
+        fused = self._fuse(vector, lexical, lexical_seconds)
+        vectors = {document_key(doc): embedding for doc, embedding in zip(vector, embeddings)}
+        return fused, [vectors.get(document_key(doc)) for doc in fused]
+
+    def _lexical(self, query):
+        start = time.perf_counter()
+        try:
+            lexical = self.index.invoke(query, self.lexical_k)
+        except Exception as e:
+            logger.warning("BM25 search failed, using vector results only: %s", e)
+            lexical = []
+        return lexical, time.perf_counter() - start
+
+    def _fuse(self, vector, lexical, lexical_seconds):
+        fused = reciprocal_rank_fusion([vector, lexical], k=self.k, rrf_k=self.rrf_k)
+        vector_keys = {document_key(doc) for doc in vector}
+        with self._lock:
+            self._queries += 1
+            self._lexical_only += sum(document_key(doc) not in vector_keys for doc in fused)
+            self._lexical_seconds += lexical_seconds
+        return fused
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queries": self._queries,
+                "lexical_only_docs": self._lexical_only,
+                "avg_lexical_ms": self._lexical_seconds / self._queries * 1000 if self._queries else 0.0,
+            }
+
+def _astra_chunks(secrets_path):
+    import toml
+    from astrapy import DataAPIClient
+    secrets = toml.load(secrets_path)
+    client = DataAPIClient(secrets["astra"]["ASTRA_DB_APPLICATION_TOKEN"])
+    db = client.get_database_by_api_endpoint(secrets["astra"]["ASTRA_DB_API_ENDPOINT"], keyspace=secrets["astra"]["ASTRA_DB_KEYSPACE"])
+    collection = db.get_collection(secrets["astra"]["ASTRA_COLLECTION_NAME"])
+    # Same layout AstraDBVectorStore writes with server-side embeddings
+    for row in collection.find({}, projection={"_id": True, "$vectorize": True, "metadata": True}):
+        if row.get("$vectorize"):
+            yield Document(id=row["_id"], page_content=row["$vectorize"], metadata=row.get("metadata") or {})
+
+def _jsonl_chunks(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield Document(id=record.get("id"), page_content=record["page_content"], metadata=record.get("metadata") or {})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build the index")
+    build.add_argument("--out", default=DEFAULT_INDEX_PATH)
+    build.add_argument("--chunks", help="JSON-lines chunks with page_content, metadata and id (default: read the Astra collection)")
+    build.add_argument("--secrets", default=".streamlit/secrets.toml")
+    build.add_argument("--catalog", default=CATALOG_PATH)
+    search = commands.add_parser("search", help="query an index")
+    search.add_argument("query")
+    search.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    search.add_argument("-k", type=int, default=5)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "build":
+        chunks = _jsonl_chunks(args.chunks) if args.chunks else _astra_chunks(args.secrets)
+        BM25Index.build(chunks, args.out, catalog=load_catalog(args.catalog))
+    else:
+        index = BM25Index.load(args.index)
+        for position, score in index.search(args.query, args.k):
+            doc = index.document(position)
+            print(f"{score:7.2f}  {doc.metadata.get('title') or doc.metadata.get('author', '')} (page {doc.metadata.get('page', 'N/A')})")
+
+if __name__ == "__main__":
+    main()
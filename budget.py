@@ -0,0 +1,38 @@
+import time
+from dataclasses import dataclass
+
+DEFAULT_MAX_REWRITES = 2
+DEFAULT_DEADLINE_SECONDS = 60.0
+DEFAULT_MAX_LLM_CALLS = 50
+
+# generate + check_hallucination still have to run after the loop gives up
+_RESERVED_LLM_CALLS = 2
+
+def charge(state, llm_calls=0, rewrites=0) -> dict:
+    """Return the request's budget ledger with the given usage added.
+
+    The ledger lives in the graph state under "budget" and is stamped with
+    the request start time the first time anything is charged.
+    """
+    budget = dict(state.get("budget") or {})
+    budget.setdefault("started_at", time.time())
+    budget["llm_calls"] = budget.get("llm_calls", 0) + llm_calls
+    budget["rewrites"] = budget.get("rewrites", 0) + rewrites
+    return budget
+
+@dataclass(frozen=True)
+class RequestBudget:
+    """Per-request limits on the rewrite -> retrieve -> grade loop."""
+    max_rewrites: int = DEFAULT_MAX_REWRITES
+    deadline_seconds: float = DEFAULT_DEADLINE_SECONDS
+    max_llm_calls: int = DEFAULT_MAX_LLM_CALLS
+
+    def exhausted(self, budget: dict, next_iteration_calls: int = 0):
+        """Name the limit another rewrite iteration would break, or None if it can run."""
+        if budget.get("rewrites", 0) >= self.max_rewrites:
+            return "max_rewrites"
+        if time.time() - budget.get("started_at", time.time()) >= self.deadline_seconds:
+            return "deadline"
+        if budget.get("llm_calls", 0) + next_iteration_calls + _RESERVED_LLM_CALLS > self.max_llm_calls:
+            return "max_llm_calls"
+        return None
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = "notebooks/files/pdf_metadata.csv"
+CACHE_DIR = ".cache/catalog"
+COLUMNS = ["filename", "title", "pdf_url", "source_url", "creationDate"]
+SEARCH_COLUMNS = ("title", "filename", "source_url")
+CACHE_VERSION = 1
+
+_TERM = re.compile(r"[a-z0-9]+")
+
+def _terms(text):
+    return set(_TERM.findall(text.lower()))
+
+def parse_pdf_dates(values):
+    """PDF dates look like D:20170628153606-04'00'; keep the calendar date, NaT if unparseable."""
+    return pd.to_datetime(values.astype("string").str.slice(2, 10), format="%Y%m%d", errors="coerce")
+
+class CatalogIndex:
+    """Catalog rows plus an inverted index from search terms to row numbers.
+
+    Terms are stored sorted so a query word matches every term it prefixes;
+    the last word of a query is usually still being typed.
+    """
+
+    def __init__(self, frame, terms, offsets, rows):
+        self.frame = frame
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+
+    @classmethod
+    def build(cls, frame):
+        postings = {}
+        text = frame[list(SEARCH_COLUMNS)].fillna("").astype(str).agg(" ".join, axis=1)
+        for row, value in enumerate(text):
+            for term in _terms(value):
+                postings.setdefault(term, []).append(row)
+        terms = sorted(postings)
+        counts = [len(postings[term]) for term in terms]
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        rows = np.fromiter((row for term in terms for row in postings[term]), dtype=np.int32, count=int(offsets[-1]))
+        return cls(frame, np.array(terms, dtype=object), offsets, rows)
+
+    def _prefix_rows(self, word):
+        start = np.searchsorted(self.terms, word, side="left")
+        end = np.searchsorted(self.terms, word + "\uffff", side="left")
+        if start == end:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(self.rows[self.offsets[start]:self.offsets[end]])
+
+    def search(self, query="", created_from=None, created_to=None):
+        """Row numbers matching every query word (as a prefix) and the creation date range, in catalog order."""
+        matches = None
+        for word in _TERM.findall(query.lower()):
+            rows = self._prefix_rows(word)
+            matches = rows if matches is None else np.intersect1d(matches, rows, assume_unique=True)
+            if not len(matches):
+                break
+        if matches is None:
+            matches = np.arange(len(self.frame), dtype=np.int32)
+        if created_from is not None or created_to is not None:
+            created = self.frame["created"].to_numpy()[matches]
+            keep = ~pd.isna(created)
+            if created_from is not None:
+                keep &= created >= np.datetime64(created_from)
+            if created_to is not None:
+                keep &= created <= np.datetime64(created_to)
+            matches = matches[keep]
+        return matches
+
+    def page(self, rows, page, page_size):
+        """One page (1-based) of the given rows as a DataFrame."""
+        start = (page - 1) * page_size
+        return self.frame.iloc[rows[start:start + page_size]]
+
+    def date_bounds(self):
+        created = self.frame["created"].dropna()
+        return (created.min(), created.max()) if len(created) else (None, None)
+
+def _cache_key(csv_path):
+    stat = os.stat(csv_path)
+    return {"version": CACHE_VERSION, "csv": os.path.abspath(csv_path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+def load_catalog_index(csv_path=CATALOG_PATH, cache_dir=CACHE_DIR):
+    """Load the catalog from its Parquet cache, rebuilding it when the CSV has changed."""
+    key = _cache_key(csv_path)
+    meta_path = os.path.join(cache_dir, "meta.json")
+    try:
+        with open(meta_path) as f:
+            if json.load(f) == key:
+                frame = pd.read_parquet(os.path.join(cache_dir, "catalog.parquet"))
+                with np.load(os.path.join(cache_dir, "index.npz"), allow_pickle=False) as index:
+                    return CatalogIndex(frame, index["terms"].astype(object), index["offsets"], index["rows"])
+    except (OSError, ValueError, KeyError) as e:
+        logger.info("Catalog cache unusable, rebuilding: %s", e)
+
+    frame = pd.read_csv(csv_path, usecols=COLUMNS, dtype="string")[COLUMNS]
+    frame["created"] = parse_pdf_dates(frame["creationDate"])
+    frame = frame.reset_index(drop=True)
+    catalog = CatalogIndex.build(frame)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        frame.to_parquet(os.path.join(cache_dir, "catalog.parquet"), index=False)
+        np.savez(os.path.join(cache_dir, "index.npz"), terms=catalog.terms.astype(str), offsets=catalog.offsets, rows=catalog.rows)
+        # Written last, so a partial cache is never mistaken for a valid one
+        with open(meta_path, "w") as f:
+            json.dump(key, f)
+    except OSError as e:
+        logger.warning("Could not write catalog cache to %s: %s", cache_dir, e)
+    return catalog
+
+def catalog_mtime(csv_path=CATALOG_PATH):
+    return os.stat(csv_path).st_mtime_ns
@@ -0,0 +1,324 @@
+"""LangGraph checkpointer on a local SQLite file.
+
+Conversations are LangGraph threads: the chat graph is compiled with this
+saver and every turn runs with the session's thread id, so the messages
+channel carries the conversation across reruns, reloads and restarts.
+
+Channel values are stored once per channel version (as the in-memory and
+Postgres savers do), so a checkpoint only writes the channels that changed.
+Append-only channels (the conversation's messages) are stored item by item
+instead: a new version writes just the items added since the last one and
+records its length, so a thread's storage grows linearly with its messages.
+compact() keeps just a thread's latest checkpoint; expire() drops threads
+nobody has touched for max_idle_seconds.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Iterator, Optional, Sequence
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = "checkpoints.sqlite3"
+DEFAULT_MAX_IDLE_SECONDS = 30 * 24 * 3600
+DEFAULT_EXPIRE_INTERVAL_SECONDS = 3600
+# Channels whose list value only ever grows at the end
+DEFAULT_APPEND_ONLY_CHANNELS = ("messages",)
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS threads (
+        thread_id TEXT PRIMARY KEY,
+        owner TEXT,
+        created_at REAL,
+        updated_at REAL
+    )""",
+    """CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id TEXT,
+        checkpoint_ns TEXT,
+        checkpoint_id TEXT,
+        parent_checkpoint_id TEXT,
+        type TEXT,
+        checkpoint BLOB,
+        metadata_type TEXT,
+        metadata BLOB,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS blobs (
+        thread_id TEXT,
+        checkpoint_ns TEXT,
+        channel TEXT,
+        version TEXT,
+        type TEXT,
+        blob BLOB,
+        PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+    )""",
+    """CREATE TABLE IF NOT EXISTS channel_items (
+        thread_id TEXT,
+        checkpoint_ns TEXT,
+        channel TEXT,
+        position INTEGER,
+        type TEXT,
+        blob BLOB,
+        PRIMARY KEY (thread_id, checkpoint_ns, channel, position)
+    )""",
+    """CREATE TABLE IF NOT EXISTS writes (
+        thread_id TEXT,
+        checkpoint_ns TEXT,
+        checkpoint_id TEXT,
+        task_id TEXT,
+        idx INTEGER,
+        channel TEXT,
+        type TEXT,
+        blob BLOB,
+        task_path TEXT,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    )""",
+    "CREATE INDEX IF NOT EXISTS threads_updated ON threads (updated_at)",
+)
+
+def _config(thread_id, checkpoint_ns, checkpoint_id):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """Checkpoints for every session in the process, in one SQLite file."""
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH, max_idle_seconds=DEFAULT_MAX_IDLE_SECONDS, expire_interval_seconds=DEFAULT_EXPIRE_INTERVAL_SECONDS,
+                 append_only_channels=DEFAULT_APPEND_ONLY_CHANNELS, *, serde=None):
+        super().__init__(serde=serde)
+        self.path = path
+        self.append_only_channels = frozenset(append_only_channels)
+        self.max_idle_seconds = max_idle_seconds
+        self.expire_interval_seconds = expire_interval_seconds
+        self._last_expired = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    def claim(self, thread_id, owner) -> bool:
+        """Register thread_id for owner; False if it already belongs to someone else."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO threads VALUES (?, ?, ?, ?)", (thread_id, owner, now, now))
+            self._conn.execute("UPDATE threads SET owner = ? WHERE thread_id = ? AND owner IS NULL", (owner, thread_id))
+            self._conn.commit()
+            row = self._conn.execute("SELECT owner FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        return row is not None and row[0] == owner
+
+    def _load_tuple(self, row) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint = self.serde.loads_typed((type_, checkpoint_blob))
+        versions = [(channel, str(version)) for channel, version in checkpoint["channel_versions"].items()]
+        with self._lock:
+            blobs = self._conn.execute(
+                "SELECT channel, type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND (channel, version) IN (VALUES "
+                + ", ".join("(?, ?)" for _ in versions) + ")",
+                [thread_id, checkpoint_ns, *(value for pair in versions for value in pair)],
+            ).fetchall() if versions else []
+            writes = self._conn.execute(
+                "SELECT task_id, channel, type, blob FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            ).fetchall()
+            # An "items" blob holds the list's length; the list is the channel's first that many items
+            items = {
+                channel: self._conn.execute(
+                    "SELECT type, blob FROM channel_items WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND position < ? ORDER BY position",
+                    (thread_id, checkpoint_ns, channel, int(blob)),
+                ).fetchall()
+                for channel, blob_type, blob in blobs
+                if blob_type == "items"
+            }
+        channel_values = {
+            channel: [self.serde.loads_typed(item) for item in items[channel]] if blob_type == "items" else self.serde.loads_typed((blob_type, blob))
+            for channel, blob_type, blob in blobs
+            if blob_type != "empty"
+        }
+        return CheckpointTuple(
+            config=_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=_config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=[(task_id, channel, self.serde.loads_typed((blob_type, blob))) for task_id, channel, blob_type, blob in writes],
+        )
+
+    def get_tuple(self, config) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        # Checkpoint ids are time-ordered, so the largest is the latest
+        query += " ORDER BY checkpoint_id DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+        return self._load_tuple(row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None) -> Iterator[CheckpointTuple]:
+        query = "SELECT * FROM checkpoints WHERE 1 = 1"
+        params = []
+        if config:
+            query += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query += " AND checkpoint_id < ?"
+            params.append(before_id)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            checkpoint_tuple = self._load_tuple(row)
+            if filter and not all(checkpoint_tuple.metadata.get(key) == value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield checkpoint_tuple
+
+    def put(self, config, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        values = checkpoint.get("channel_values", {})
+        stored = {key: value for key, value in checkpoint.items() if key != "channel_values"}
+        type_, checkpoint_blob = self.serde.dumps_typed(stored)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        appended = {
+            channel: values[channel] for channel in new_versions
+            if channel in self.append_only_channels and isinstance(values.get(channel), list)
+        }
+        # Only channels written since the last checkpoint get a new blob
+        blobs = [
+            (thread_id, checkpoint_ns, channel, str(version), *(self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")))
+            for channel, version in new_versions.items()
+            if channel not in appended
+        ]
+        now = time.time()
+        with self._lock:
+            for channel, items in appended.items():
+                stored = self._conn.execute(
+                    "SELECT COUNT(*) FROM channel_items WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ?",
+                    (thread_id, checkpoint_ns, channel),
+                ).fetchone()[0]
+                if len(items) < stored:
+                    # Shorter than what is stored (a fork from an older checkpoint): keep this version whole
+                    blobs.append((thread_id, checkpoint_ns, channel, str(new_versions[channel]), *self.serde.dumps_typed(items)))
+                    continue
+                self._conn.executemany(
+                    "INSERT INTO channel_items VALUES (?, ?, ?, ?, ?, ?)",
+                    [(thread_id, checkpoint_ns, channel, position, *self.serde.dumps_typed(item)) for position, item in enumerate(items[stored:], start=stored)],
+                )
+                blobs.append((thread_id, checkpoint_ns, channel, str(new_versions[channel]), "items", str(len(items)).encode()))
+            self._conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"), type_, checkpoint_blob, metadata_type, metadata_blob),
+            )
+            self._conn.execute(
+                "INSERT INTO threads VALUES (?, NULL, ?, ?) ON CONFLICT (thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (thread_id, now, now),
+            )
+            self._conn.commit()
+        return _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, *self.serde.dumps_typed(value), task_path))
+        # A task's regular writes are stored once; special ones (errors, interrupts) are replaced
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        with self._lock:
+            self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def delete_thread(self, thread_id) -> None:
+        with self._lock:
+            for table in ("checkpoints", "blobs", "channel_items", "writes", "threads"):
+                self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    def get_next_version(self, current, channel) -> str:
+        # Same zero-padded, sortable versions as the in-memory saver
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def compact(self, thread_id) -> int:
+        """Keep only the thread's latest checkpoint and the blobs it uses; returns rows deleted."""
+        latest = self.get_tuple({"configurable": {"thread_id": thread_id}})
+        if latest is None:
+            return 0
+        checkpoint_id = latest.config["configurable"]["checkpoint_id"]
+        keep = [(channel, str(version)) for channel, version in latest.checkpoint["channel_versions"].items()]
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id != ?", (thread_id, checkpoint_id)
+            ).rowcount
+            deleted += self._conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_id != ?", (thread_id, checkpoint_id)
+            ).rowcount
+            for channel, version in self._conn.execute(
+                "SELECT channel, version FROM blobs WHERE thread_id = ?", (thread_id,)
+            ).fetchall():
+                if (channel, version) not in keep:
+                    deleted += self._conn.execute(
+                        "DELETE FROM blobs WHERE thread_id = ? AND channel = ? AND version = ?", (thread_id, channel, version)
+                    ).rowcount
+            self._conn.commit()
+        return deleted
+
+    def expire(self, max_idle_seconds=None) -> int:
+        """Delete threads idle for longer than max_idle_seconds; returns how many."""
+        cutoff = time.time() - (self.max_idle_seconds if max_idle_seconds is None else max_idle_seconds)
+        with self._lock:
+            stale = [row[0] for row in self._conn.execute("SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,))]
+        for thread_id in stale:
+            self.delete_thread(thread_id)
+        self._last_expired = time.time()
+        if stale:
+            logger.info("Expired %d idle conversation threads", len(stale))
+        return len(stale)
+
+    def maintain(self, thread_id) -> None:
+        """Compact thread_id and expire idle threads when due; meant for a background thread."""
+        try:
+            self.compact(thread_id)
+            if time.time() - self._last_expired > self.expire_interval_seconds:
+                self.expire()
+        except sqlite3.Error as e:
+            logger.warning("Checkpoint maintenance failed: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("threads", "checkpoints", "blobs", "channel_items", "writes")}
+        return counts
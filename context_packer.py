@@ -0,0 +1,122 @@
+import os
+import re
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from history import count_tokens, clip_tokens, DEFAULT_ENCODING
+
+DEFAULT_MAX_TOKENS = 6000
+# Overlaps shorter than this are coincidence, not chunker overlap
+_MIN_OVERLAP_CHARS = 20
+# Boilerplate lines are short; long repeated lines are probably real content
+_MAX_BOILERPLATE_CHARS = 120
+# Don't bother adding a clipped source with less room than this
+_MIN_CLIPPED_TOKENS = 100
+
+_PAGE_NUMBER = re.compile(r"^(page\s*)?[-–\s]*\d+[-–\s]*(of\s*\d+)?$", re.IGNORECASE)
+_PAGE_LABEL = re.compile(r"\bpage\s*\d+(\s*of\s*\d+)?\b", re.IGNORECASE)
+# Citation tokens as bm25 reads them ("BCO 13-6"); a line carrying one is content, however often it repeats
+_CITATION = re.compile(r"\d+(?:[-‐-―]\d+)+")
+# Running headers and footers sit in the first or last lines of a chunk and recur across pages
+_EDGE_LINES = 2
+_BOILERPLATE_MIN_PAGES = 3
+
+def _line_key(line):
+    # "Page 12" and "Page 13" are the same footer; any other number makes a different line
+    return _PAGE_LABEL.sub("page #", line.strip().lower())
+
+def _edge_lines(text):
+    lines = [line for line in text.splitlines() if line.strip()]
+    return set(lines[:_EDGE_LINES] + lines[-_EDGE_LINES:])
+
+def _boilerplate_lines(documents):
+    """Line keys at the edges of chunks from at least three pages of the same PDF."""
+    pages_by_line = {}
+    for doc in documents:
+        source = doc.metadata.get("author", "")
+        page = doc.metadata.get("page")
+        for line in _edge_lines(doc.page_content):
+            key = _line_key(line)
+            if key and len(key) <= _MAX_BOILERPLATE_CHARS and not _CITATION.search(line):
+                pages_by_line.setdefault((source, key), set()).add(page)
+    return {line for line, pages in pages_by_line.items() if len(pages) >= _BOILERPLATE_MIN_PAGES}
+
+def _strip_boilerplate(doc, boilerplate):
+    source = doc.metadata.get("author", "")
+    edges = _edge_lines(doc.page_content)
+    lines = [
+        line for line in doc.page_content.splitlines()
+        if not (line in edges and (source, _line_key(line)) in boilerplate) and not _PAGE_NUMBER.match(line.strip())
+    ]
+    return "\n".join(lines).strip()
+
+def _overlap(a, b):
+    """Length of the longest suffix of a that is a prefix of b."""
+    for size in range(min(len(a), len(b)), _MIN_OVERLAP_CHARS - 1, -1):
+        if a.endswith(b[:size]):
+            return size
+    return 0
+
+def merge_chunks(texts):
+    """Merge chunks from one page, dropping duplicated or overlapping text."""
+    merged = []
+    for text in texts:
+        if not text:
+            continue
+        for i, existing in enumerate(merged):
+            if text in existing:
+                break
+            if existing in text:
+                merged[i] = text
+                break
+            forward, backward = _overlap(existing, text), _overlap(text, existing)
+            if forward or backward:
+                merged[i] = existing + text[forward:] if forward >= backward else text + existing[backward:]
+                break
+        else:
+            merged.append(text)
+    return "\n...\n".join(merged)
+
+def _source_label(doc):
+    title = doc.metadata.get("title", "").strip()
+    url = doc.metadata.get("author", "").strip()
+    if not title and url:
+        title = os.path.basename(urlparse(url).path)
+    return f"[Source: {title or 'Unknown Document'}, page {doc.metadata.get('page', 'N/A')}]"
+
+def pack_context(documents, max_tokens=DEFAULT_MAX_TOKENS, encoding=DEFAULT_ENCODING):
+    """Build one prompt context from relevance-ordered documents.
+
+    Chunks sharing a PDF (metadata['author']) and page are merged, lines
+    repeated at the edges of chunks from three or more pages of the same PDF
+    (running headers and footers) and bare page numbers are removed, and sources are added in relevance order
+    until max_tokens is reached.
+    """
+    boilerplate = _boilerplate_lines(documents)
+    groups = OrderedDict()
+    for doc in documents:
+        key = (doc.metadata.get("author", ""), doc.metadata.get("page"))
+        if key not in groups:
+            groups[key] = (doc, [])
+        groups[key][1].append(_strip_boilerplate(doc, boilerplate))
+
+    sections = []
+    remaining = max_tokens
+    for doc, texts in groups.values():
+        text = merge_chunks(texts)
+        if not text:
+            continue
+        section = f"{_source_label(doc)}\n{text}"
+        tokens = count_tokens(section, encoding)
+        if tokens > remaining:
+            if remaining >= _MIN_CLIPPED_TOKENS:
+                sections.append(clip_tokens(section, remaining, encoding))
+            break
+        sections.append(section)
+        remaining -= tokens
+    return "\n\n".join(sections)
+
+def context_stats(documents, context, encoding=DEFAULT_ENCODING):
+    raw_tokens = count_tokens("\n\n".join(doc.page_content for doc in documents), encoding)
+    packed_tokens = count_tokens(context, encoding)
+    return {"raw_tokens": raw_tokens, "packed_tokens": packed_tokens, "tokens_saved": max(raw_tokens - packed_tokens, 0)}
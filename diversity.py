@@ -0,0 +1,105 @@
+import numpy as np
+
+DIVERSITY_METHODS = ("jaccard", "mmr")
+DEFAULT_MMR_LAMBDA = 0.5
+
+def candidate_tokens(candidate):
+    """Token set of a scored candidate, computed on first use and cached on the candidate."""
+    tokens = candidate.get("tokens")
+    if tokens is None:
+        tokens = candidate["tokens"] = frozenset(candidate["doc"].page_content.lower().split())
+    return tokens
+
+def jaccard_select(scored_docs, max_docs, similarity_threshold):
+    """Greedy selection skipping candidates whose word-set Jaccard similarity with
+    an already selected document exceeds the threshold."""
+    selected = [scored_docs[0]["doc"]]  # Always include top doc
+    selected_tokens = [candidate_tokens(scored_docs[0])]
+
+    for candidate in scored_docs[1:]:
+        if len(selected) >= max_docs:
+            break
+
+        tokens = candidate_tokens(candidate)
+        is_diverse = True
+        for other in selected_tokens:
+            common = len(tokens & other)
+            total = len(tokens) + len(other) - common
+            if total > 0 and common / total > similarity_threshold:
+                is_diverse = False
+                break
+
+        if is_diverse:
+            selected.append(candidate["doc"])
+            selected_tokens.append(tokens)
+
+    return selected
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def _jaccard(a, b):
+    total = len(a) + len(b) - len(a & b)
+    return len(a & b) / total if total else 0.0
+
+def _similarity(scored_docs):
+    """Cosine similarity between candidates; pairs with a candidate that has no
+    vector (found by keyword search only) use word-set Jaccard instead."""
+    present = [candidate["embedding"] for candidate in scored_docs if candidate.get("embedding") is not None]
+    dimensions = len(present[0])
+    unit = _unit_rows([
+        candidate["embedding"] if candidate.get("embedding") is not None else np.zeros(dimensions)
+        for candidate in scored_docs
+    ])
+    similarity = unit @ unit.T
+    for i, candidate in enumerate(scored_docs):
+        if candidate.get("embedding") is None:
+            tokens = candidate_tokens(candidate)
+            for j, other in enumerate(scored_docs):
+                similarity[i, j] = similarity[j, i] = _jaccard(tokens, candidate_tokens(other))
+    return similarity
+
+def mmr_select(scored_docs, max_docs, lambda_mult=DEFAULT_MMR_LAMBDA):
+    """Maximal marginal relevance over the candidates' embeddings.
+
+    Relevance is the grader's score; redundancy is the highest similarity to
+    anything already selected. At least one candidate needs an embedding.
+    """
+    similarity = _similarity(scored_docs)
+    relevance = np.asarray([candidate["score"] for candidate in scored_docs], dtype=np.float32)
+
+    selected = [0]  # Always include top doc
+    redundancy = similarity[0].copy()
+    limit = min(max_docs, len(scored_docs))
+    while len(selected) < limit:
+        mmr = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        mmr[selected] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        np.maximum(redundancy, similarity[best], out=redundancy)
+
+    return [scored_docs[i]["doc"] for i in selected]
+
+def retrieve_with_embeddings(retriever, question):
+    """Run the retriever's similarity search but keep the document vectors.
+
+    Mirrors `similarity_score_threshold` retrieval on a VectorStoreRetriever,
+    scoring with Astra's cosine similarity, (1 + cos) / 2.
+    """
+    search_kwargs = retriever.search_kwargs
+    query_vector, hits = retriever.vectorstore.similarity_search_with_embedding(
+        question,
+        k=search_kwargs.get("k", 4),
+        filter=search_kwargs.get("filter"),
+    )
+    if not hits:
+        return [], []
+
+    vectors = np.asarray([embedding for _, embedding in hits], dtype=np.float32)
+    scores = (1 + _unit_rows(vectors) @ _unit_rows(query_vector)) / 2
+    threshold = search_kwargs.get("score_threshold")
+    keep = [i for i in range(len(hits)) if threshold is None or scores[i] >= threshold]
+    return [hits[i][0] for i in keep], [vectors[i] for i in keep]
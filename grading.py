@@ -0,0 +1,75 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from llm_gateway import llm_deadline
+
+logger = logging.getLogger(__name__)
+
+GRADING_MODES = ("concurrent", "batched", "local")
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 30.0
+_POLL_INTERVAL = 0.05
+
+def grade_concurrently(grader, payloads, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+    """Invoke the grader once per payload in a bounded thread pool.
+
+    Returns a list aligned with payloads. Calls that fail or run longer than
+    `timeout` seconds (measured from when the call started) come back as None.
+    """
+    results = [None] * len(payloads)
+    if not payloads:
+        return results
+
+    started = {}
+
+    def run(i):
+        started[i] = time.monotonic()
+        # A call still queued for rate-limit capacity when this gives up leaves the queue too
+        with llm_deadline(timeout):
+            return grader.invoke(payloads[i])
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(payloads))), thread_name_prefix="grader")
+    # Each call runs in a copy of the caller's context so per-node LLM tracing still sees it
+    futures = {pool.submit(contextvars.copy_context().run, run, i): i for i in range(len(payloads))}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    logger.warning("Grading call %d failed: %s", i, e)
+            now = time.monotonic()
+            expired = {f for f in pending if futures[f] in started and now - started[futures[f]] > timeout}
+            for future in expired:
+                logger.warning("Grading call %d timed out after %.1fs", futures[future], timeout)
+            pending -= expired
+    finally:
+        # Timed-out calls keep running in their worker, but nobody waits on them.
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
+
+def format_numbered_documents(documents):
+    return "\n\n".join(f"Document {i}:\n{doc.page_content}" for i, doc in enumerate(documents, start=1))
+
+def grade_in_batch(batch_grader, question, documents, timeout=DEFAULT_TIMEOUT):
+    """Grade every document with a single structured-output call.
+
+    The batch grader returns grades carrying the 1-based document number; they
+    are mapped back to a list aligned with documents, with None for any
+    document the model skipped. Raises if the call fails or times out.
+    """
+    payload = {"question": question, "documents": format_numbered_documents(documents)}
+    result = grade_concurrently(batch_grader, [payload], max_concurrency=1, timeout=timeout)[0]
+    if result is None:
+        raise RuntimeError("Batched grading call failed or timed out")
+
+    grades = [None] * len(documents)
+    for grade in result.grades:
+        if 1 <= grade.index <= len(documents) and grades[grade.index - 1] is None:
+            grades[grade.index - 1] = grade
+    return grades
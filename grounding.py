@@ -0,0 +1,67 @@
+import re
+from typing import Optional
+
+DEFAULT_LOW = 0.2
+DEFAULT_HIGH = 0.7
+
+# Word pairs reward verbatim support but count less than single words, so paraphrases land mid-range
+_PAIR_WEIGHT = 0.3
+_MIN_SENTENCE_WORDS = 4
+
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from has have he her his how i if in into is it its
+may might must not of on or our shall she should so such than that the their them then there these they this
+those to was we were what when where which who will with would you your also any all more most other some
+""".split())
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"\w+")
+_SUFFIX = re.compile(r"(ing|ed|es|s)$")
+
+def _content_words(text):
+    # Crude suffix stripping so "filed" supports "file"
+    return [_SUFFIX.sub("", word) if len(word) > 4 else word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+
+def grounding_score(generation: str, documents) -> Optional[float]:
+    """Average share of each answer sentence's words and word pairs found in the documents.
+
+    Returns None when the answer has no sentence long enough to judge.
+    """
+    source_words = _content_words(" ".join(doc.page_content for doc in documents))
+    vocabulary = set(source_words)
+    pairs = set(zip(source_words, source_words[1:]))
+
+    coverages = []
+    for sentence in _SENTENCE_SPLIT.split(generation):
+        words = _content_words(sentence)
+        if len(words) < _MIN_SENTENCE_WORDS:
+            continue
+        word_coverage = sum(word in vocabulary for word in words) / len(words)
+        sentence_pairs = list(zip(words, words[1:]))
+        pair_coverage = sum(pair in pairs for pair in sentence_pairs) / len(sentence_pairs)
+        coverages.append((1 - _PAIR_WEIGHT) * word_coverage + _PAIR_WEIGHT * pair_coverage)
+    return sum(coverages) / len(coverages) if coverages else None
+
+def local_hallucination_check(generation: str, documents, low=DEFAULT_LOW, high=DEFAULT_HIGH) -> dict:
+    """Cheap first tier of the hallucination check.
+
+    Scores at or above high count as grounded and at or below low as not
+    grounded. Anything in between is marked pending for the LLM checker.
+    """
+    score = grounding_score(generation, documents)
+    if score is None or low < score < high:
+        return {
+            "is_grounded": True,
+            "confidence": score if score is not None else 0.5,
+            "issues": "Local overlap check was inconclusive; verifying with the LLM checker",
+            "method": "local",
+            "pending": True,
+        }
+    grounded = score >= high
+    return {
+        "is_grounded": grounded,
+        "confidence": score,
+        "issues": "" if grounded else "Most of the response does not overlap with the source documents",
+        "method": "local",
+        "pending": False,
+    }
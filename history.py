@@ -0,0 +1,134 @@
+import logging
+import threading
+from functools import lru_cache
+
+from langchain_core.messages import SystemMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEEP_TURNS = 4
+DEFAULT_MAX_TOKENS = 2000
+DEFAULT_ENCODING = "o200k_base"
+# Older messages not yet folded into the summary are clipped to this many tokens each
+_UNFOLDED_MESSAGE_TOKENS = 60
+
+@lru_cache(maxsize=None)
+def _encoding(name):
+    import tiktoken
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # The encoding file is downloaded on first use; estimate if that is not possible
+        logger.warning("tiktoken encoding %s unavailable, estimating tokens from length: %s", name, e)
+        return None
+
+def count_tokens(text: str, encoding=DEFAULT_ENCODING) -> int:
+    enc = _encoding(encoding)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+def clip_tokens(text: str, max_tokens: int, encoding=DEFAULT_ENCODING) -> str:
+    enc = _encoding(encoding)
+    if enc is None:
+        return text if len(text) <= max_tokens * 4 else text[:max(max_tokens * 4 - 3, 0)] + "..."
+    tokens = enc.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else enc.decode(tokens[:max_tokens]) + "..."
+
+def _label(message):
+    return "User" if message.type == "human" else "Assistant"
+
+class RollingSummary:
+    """Per-session summary of the turns that have left the verbatim window."""
+
+    def __init__(self, text="", folded=0):
+        self.text = text
+        self.folded = folded
+        self.lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        """Text and folded-message count, for storing with the conversation."""
+        with self.lock:
+            return {"text": self.text, "folded": self.folded}
+
+class ChatHistoryManager:
+    """Compacts chat history to a token budget before it reaches a prompt.
+
+    The last keep_turns exchanges (plus the current question) stay verbatim.
+    Everything older is represented by the session's rolling summary, and
+    any older messages the summary has not caught up with yet are included
+    clipped. If that still exceeds max_tokens, the oldest verbatim messages
+    are dropped, then the summary is clipped.
+    """
+
+    def __init__(self, summarize=None, keep_turns=DEFAULT_KEEP_TURNS, max_tokens=DEFAULT_MAX_TOKENS, encoding=DEFAULT_ENCODING):
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.max_tokens = max_tokens
+        self.encoding = encoding
+
+    def _split(self, messages):
+        window = self.keep_turns * 2 + 1
+        return messages[:-window] if len(messages) > window else [], messages[-window:]
+
+    def compact(self, messages, summary: RollingSummary):
+        """Return (messages for the prompt, token stats)."""
+        original_tokens = sum(count_tokens(m.content, self.encoding) for m in messages)
+        older, recent = self._split(messages)
+        with summary.lock:
+            if summary.folded > len(older):
+                # The conversation was reset since the summary was written
+                summary.text, summary.folded = "", 0
+            summary_text, folded = summary.text, summary.folded
+
+        parts = [summary_text] if summary_text else []
+        parts += [
+            f"{_label(m)}: {clip_tokens(m.content, _UNFOLDED_MESSAGE_TOKENS, self.encoding)}"
+            for m in older[folded:]
+        ]
+        summary_block = "\n".join(parts)
+
+        recent = list(recent)
+        recent_tokens = [count_tokens(m.content, self.encoding) for m in recent]
+        summary_tokens = count_tokens(summary_block, self.encoding) if summary_block else 0
+        while len(recent) > 1 and summary_tokens + sum(recent_tokens) > self.max_tokens:
+            recent.pop(0)
+            recent_tokens.pop(0)
+        room = self.max_tokens - sum(recent_tokens)
+        if summary_block and summary_tokens > room:
+            summary_block = clip_tokens(summary_block, max(room, 0), self.encoding) if room > 0 else ""
+            summary_tokens = count_tokens(summary_block, self.encoding) if summary_block else 0
+
+        compacted = recent
+        if summary_block:
+            compacted = [SystemMessage(content=f"Summary of the earlier conversation:\n{summary_block}")] + recent
+        compacted_tokens = summary_tokens + sum(recent_tokens)
+        return compacted, {
+            "original_tokens": original_tokens,
+            "compacted_tokens": compacted_tokens,
+            "tokens_saved": max(original_tokens - compacted_tokens, 0),
+        }
+
+    def refresh_summary(self, messages, summary: RollingSummary) -> None:
+        """Fold messages that left the verbatim window into the summary.
+
+        Makes one summarizer call for all newly folded messages. Meant to run
+        off the request thread, after an answer has been shown.
+        """
+        if self.summarize is None:
+            return
+        older, _ = self._split(messages)
+        with summary.lock:
+            if summary.folded >= len(older):
+                return
+            previous, start = summary.text, summary.folded
+        new_messages = "\n".join(f"{_label(m)}: {m.content}" for m in older[start:])
+        try:
+            text = self.summarize(previous, new_messages)
+        except Exception as e:
+            logger.warning("Chat history summary update failed: %s", e)
+            return
+        with summary.lock:
+            # Another update may have landed meanwhile; keep whichever covers more
+            if summary.folded == start:
+                summary.text, summary.folded = text, len(older)
@@ -0,0 +1,422 @@
+"""Incremental, parallel ingestion of the PDF corpus into the vector store.
+
+Driven by the document catalog (pdf_metadata.csv). PDFs are parsed and
+cleaned in a process pool, chunked per page, and written in batches:
+
+    python -m ingest                                  # Astra collection from .streamlit/secrets.toml
+    python -m ingest --store local:indexes/chunks.jsonl
+    python -m ingest --dry-run
+    python -m ingest --reset                          # first run against a collection loaded some other way
+
+A manifest records each file's content hash and the ids of its chunks. Chunk
+ids are hashes of the chunk text, so a re-run only parses new or changed
+files, only writes (and embeds) chunks whose text changed, and deletes the
+chunks of changed and removed PDFs. The local store's JSON lines are what
+`python -m bm25 build --chunks` reads.
+
+Chunks the manifest doesn't know about are never touched, so a run with an
+empty manifest against a store that already has chunks would add a second
+copy of everything. That is refused unless --reset clears the store first.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+CATALOG_PATH = "notebooks/files/pdf_metadata.csv"
+# file_path in the catalog is relative to the notebook that downloaded the PDFs
+PDF_ROOT = "notebooks"
+MANIFEST_PATH = "indexes/ingest_manifest.json"
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_BATCH_SIZE = 100
+INGESTED_STATUSES = ("downloaded", "already_exists")
+MANIFEST_VERSION = 1
+# Bump when clean_pages changes, so every file is re-chunked on the next run
+CLEANER_VERSION = 2
+
+# Running headers/footers are short, at the top or bottom of a page, and on most pages of a document
+_MAX_BOILERPLATE_CHARS = 120
+_EDGE_LINES = 3
+_BOILERPLATE_PAGE_SHARE = 0.5
+_BOILERPLATE_MIN_PAGES = 3
+# Cleaning that removes more than this share of a page's text is probably removing content
+_MOSTLY_REMOVED_SHARE = 0.5
+_PAGE_NUMBER = re.compile(r"^(page\s*)?[-–\s]*\d+[-–\s]*(of\s*\d+)?$", re.IGNORECASE)
+_PAGE_LABEL = re.compile(r"\bpage\s*\d+(\s*of\s*\d+)?\b", re.IGNORECASE)
+# Citation tokens as bm25 reads them ("BCO 13-6"); a line carrying one is content, however often it repeats
+_CITATION = re.compile(r"\d+(?:[-‐-―]\d+)+")
+_HYPHENATED = re.compile(r"(\w)-\n(\w)")
+_SPACES = re.compile(r"[ \t ]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+def _line_key(line):
+    # "Page 12" and "Page 13" are the same footer; any other number makes a different line
+    return _PAGE_LABEL.sub("page #", line.strip().lower())
+
+def _edge_lines(page):
+    lines = [line for line in page.splitlines() if line.strip()]
+    return lines[:_EDGE_LINES] + lines[-_EDGE_LINES:]
+
+def _text_size(text):
+    return len("".join(text.split()))
+
+def clean_pages(pages, source=""):
+    """Drop running headers/footers and page numbers, rejoin hyphenated words, tidy whitespace."""
+    pages = [page.replace("\x00", "") for page in pages]
+    boilerplate = set()
+    if len(pages) >= _BOILERPLATE_MIN_PAGES:
+        counts = {}
+        for page in pages:
+            for key in {_line_key(line) for line in _edge_lines(page) if not _CITATION.search(line)}:
+                if key and len(key) <= _MAX_BOILERPLATE_CHARS:
+                    counts[key] = counts.get(key, 0) + 1
+        boilerplate = {
+            key for key, count in counts.items()
+            if count >= _BOILERPLATE_MIN_PAGES and count >= _BOILERPLATE_PAGE_SHARE * len(pages)
+        }
+    cleaned = []
+    for number, page in enumerate(pages):
+        edges = set(_edge_lines(page))
+        lines = [
+            _SPACES.sub(" ", line).strip() for line in page.splitlines()
+            if not (line in edges and _line_key(line) in boilerplate and not _CITATION.search(line))
+            and not _PAGE_NUMBER.match(line.strip())
+        ]
+        text = _BLANK_LINES.sub("\n\n", _HYPHENATED.sub(r"\1\2", "\n".join(lines))).strip()
+        before = _text_size(page)
+        if before > _MAX_BOILERPLATE_CHARS and before - _text_size(text) > _MOSTLY_REMOVED_SHARE * before:
+            logger.warning("Cleaning removed %d of %d characters from page %d of %s", before - _text_size(text), before, number, source or "a PDF")
+        cleaned.append(text)
+    return cleaned
+
+def extract_pages(path):
+    """Text of each page of a PDF."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_id(key, page, text):
+    """Stable id for a chunk: unchanged text on the same page of the same file keeps its id."""
+    return hashlib.sha256(f"{key}\0{page}\0{text}".encode()).hexdigest()[:32]
+
+def process_file(path, key, metadata, chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP):
+    """Parse, clean and chunk one PDF; runs in a worker process.
+
+    Returns a list of (id, text, metadata) with metadata in the layout the
+    app expects: author is the PDF URL and page is 0-based, as PyPDFLoader
+    numbers them.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = {}
+    for page, text in enumerate(clean_pages(extract_pages(path), path)):
+        for piece in splitter.split_text(text):
+            identifier = chunk_id(key, page, piece)
+            # Identical text twice on a page is one chunk
+            chunks.setdefault(identifier, (identifier, piece, {**metadata, "page": page}))
+    return list(chunks.values())
+
+def read_catalog(path=CATALOG_PATH, pdf_root=PDF_ROOT):
+    """Ingestable catalog rows keyed by file_path, first row winning for duplicates."""
+    rows = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get("status") in INGESTED_STATUSES and row.get("file_path") and row["file_path"] not in rows:
+                rows[row["file_path"]] = {**row, "path": os.path.join(pdf_root, row["file_path"])}
+    return rows
+
+def chunk_metadata(row):
+    return {
+        "author": row.get("pdf_url", ""),
+        "title": row.get("title", ""),
+        "source": row["file_path"],
+        "source_url": row.get("source_url", ""),
+        "filename": row.get("filename", ""),
+    }
+
+class LocalVectorStore:
+    """Vector-store stand-in kept as JSON lines of id, page_content and metadata.
+
+    Has the add_documents/delete/metadata_search/clear surface ingestion uses
+    on AstraDBVectorStore, and records how many write calls were made.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.write_calls = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.records[record["id"]] = record
+
+    def add_documents(self, documents, ids=None, **kwargs):
+        ids = ids or [doc.id for doc in documents]
+        for identifier, doc in zip(ids, documents):
+            self.records[identifier] = {"id": identifier, "page_content": doc.page_content, "metadata": doc.metadata}
+        self.write_calls += 1
+        self._save()
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        for identifier in ids or ():
+            self.records.pop(identifier, None)
+        self.write_calls += 1
+        self._save()
+        return True
+
+    def metadata_search(self, filter=None, n=5):
+        records = [record for record in self.records.values() if all(record["metadata"].get(key) == value for key, value in (filter or {}).items())]
+        return [Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"]) for record in records[:n]]
+
+    def clear(self):
+        self.records = {}
+        self.write_calls += 1
+        self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        partial = self.path + ".tmp"
+        with open(partial, "w") as f:
+            for record in self.records.values():
+                f.write(json.dumps(record) + "\n")
+        os.replace(partial, self.path)
+
+def astra_store(secrets_path):
+    import toml
+    from astrapy.info import VectorServiceOptions
+    from langchain_astradb import AstraDBVectorStore
+    secrets = toml.load(secrets_path)
+    # Same collection and server-side embedding settings as get_vector_store in pages/chat.py
+    return AstraDBVectorStore(
+        collection_name=secrets["astra"]["ASTRA_COLLECTION_NAME"],
+        token=secrets["astra"]["ASTRA_DB_APPLICATION_TOKEN"],
+        api_endpoint=secrets["astra"]["ASTRA_DB_API_ENDPOINT"],
+        namespace=secrets["astra"]["ASTRA_DB_KEYSPACE"],
+        collection_vector_service_options=VectorServiceOptions(
+            provider=secrets["openai"]["OPENAI_PROVIDER"],
+            model_name=secrets["openai"]["OPENAI_TEXT_EMBEDDING_MODEL"],
+            authentication={"providerKey": secrets["astra"]["ASTRA_DB_API_KEY_NAME"]},
+        ),
+    )
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+        logger.warning("Manifest %s has an old format; every file will be re-ingested", path)
+    except FileNotFoundError:
+        pass
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+def save_manifest(manifest, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = path + ".tmp"
+    with open(partial, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    # A crash mid-write leaves the previous manifest, never a truncated one
+    os.replace(partial, path)
+
+def collection_version(manifest):
+    """Short digest of every chunk id; a value for [rag] COLLECTION_VERSION that changes with the content."""
+    digest = hashlib.sha256()
+    for key in sorted(manifest["files"]):
+        digest.update(key.encode())
+        for identifier in sorted(manifest["files"][key]["chunks"]):
+            digest.update(identifier.encode())
+    return digest.hexdigest()[:12]
+
+class BatchWriter:
+    """Buffers chunk writes and deletes, flushing them in batches.
+
+    Manifest entries are committed only after their chunks are written, so an
+    interrupted run redoes just the files whose writes were lost.
+    """
+
+    def __init__(self, store, manifest, manifest_path, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+        self.store = store
+        self.manifest = manifest
+        self.manifest_path = manifest_path
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.adds = []
+        self.deletes = []
+        self.entries = {}
+        self.added = 0
+        self.deleted = 0
+
+    def update(self, key, entry, new_chunks=(), stale_ids=()):
+        """Queue a file's new chunks and stale chunk ids; entry None removes the file."""
+        self.adds.extend(new_chunks)
+        self.deletes.extend(stale_ids)
+        self.entries[key] = entry
+        if len(self.adds) >= self.batch_size or len(self.deletes) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.dry_run:
+            # Write before deleting, so a changed document is never missing from the store
+            for start in range(0, len(self.adds), self.batch_size):
+                batch = self.adds[start:start + self.batch_size]
+                self.store.add_documents(
+                    [Document(id=identifier, page_content=text, metadata=metadata) for identifier, text, metadata in batch],
+                    ids=[identifier for identifier, _, _ in batch],
+                )
+            for start in range(0, len(self.deletes), self.batch_size):
+                self.store.delete(ids=self.deletes[start:start + self.batch_size])
+        self.added += len(self.adds)
+        self.deleted += len(self.deletes)
+        for key, entry in self.entries.items():
+            if entry is None:
+                self.manifest["files"].pop(key, None)
+            else:
+                self.manifest["files"][key] = entry
+        if not self.dry_run and self.entries:
+            save_manifest(self.manifest, self.manifest_path)
+        self.adds, self.deletes, self.entries = [], [], {}
+
+def ingest(store, catalog_path=CATALOG_PATH, pdf_root=PDF_ROOT, manifest_path=MANIFEST_PATH, store_name="",
+           chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP, batch_size=DEFAULT_BATCH_SIZE,
+           workers=None, dry_run=False, reset=False) -> dict:
+    """Bring the store in line with the catalog and return a summary of what changed.
+
+    reset clears the store and starts from an empty manifest, for a first run
+    against a store whose chunks weren't written by this tool.
+    """
+    start = time.perf_counter()
+    rows = read_catalog(catalog_path, pdf_root)
+    present = {key: row for key, row in rows.items() if os.path.isfile(row["path"])}
+    if rows and not present:
+        raise SystemExit(f"None of the {len(rows)} catalog PDFs exist under {pdf_root!r}; refusing to delete the whole collection")
+    if len(present) < len(rows):
+        logger.warning("%d catalog PDFs are missing on disk and will be removed from the store", len(rows) - len(present))
+
+    manifest = load_manifest(manifest_path)
+    if reset:
+        logger.warning("Clearing %s; every catalog PDF will be ingested again", store_name or "the store")
+        manifest = {"version": MANIFEST_VERSION, "files": {}, "store": store_name}
+        if not dry_run:
+            store.clear()
+            # An interrupted run must not leave a manifest listing chunks that are gone
+            save_manifest(manifest, manifest_path)
+    elif not manifest["files"] and store.metadata_search(n=1):
+        raise SystemExit(
+            f"Manifest {manifest_path} tracks no chunks but {store_name or 'the store'} already has some; "
+            "ingesting would add a second copy of every chunk. Pass --reset to clear the store first"
+        )
+    if manifest["files"] and manifest.get("store") != store_name:
+        raise SystemExit(f"Manifest {manifest_path} tracks {manifest.get('store')!r}, not {store_name!r}; pass --manifest for a separate one")
+    manifest["store"] = store_name
+    settings = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "cleaner": CLEANER_VERSION}
+    writer = BatchWriter(store, manifest, manifest_path, batch_size, dry_run)
+    summary = {"new": 0, "changed": 0, "unchanged": 0, "removed": 0, "failed": 0, "chunks_kept": 0}
+
+    # Cheap stat check first; hash only files whose size or mtime moved
+    pending = []
+    for key, row in present.items():
+        stat = os.stat(row["path"])
+        entry = manifest["files"].get(key)
+        fresh = entry is not None and entry["settings"] == settings and entry["metadata"] == chunk_metadata(row)
+        if fresh and (entry["size"], entry["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            summary["unchanged"] += 1
+            continue
+        sha256 = file_sha256(row["path"])
+        if fresh and entry["sha256"] == sha256:
+            summary["unchanged"] += 1
+            writer.update(key, {**entry, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+            continue
+        pending.append((key, row, stat, sha256))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_file, row["path"], key, chunk_metadata(row), chunk_size, chunk_overlap): (key, row, stat, sha256)
+            for key, row, stat, sha256 in pending
+        }
+        for future in as_completed(futures):
+            key, row, stat, sha256 = futures[future]
+            try:
+                chunks = future.result()
+            except Exception as e:
+                # Keep whatever the store has for this file; it is retried next run
+                logger.warning("Could not ingest %s: %s", row["path"], e)
+                summary["failed"] += 1
+                continue
+            old_ids = set(manifest["files"].get(key, {}).get("chunks", ()))
+            new_ids = [identifier for identifier, _, _ in chunks]
+            summary["changed" if key in manifest["files"] else "new"] += 1
+            summary["chunks_kept"] += len(old_ids.intersection(new_ids))
+            writer.update(
+                key,
+                {"sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "settings": settings,
+                 "metadata": chunk_metadata(row), "chunks": new_ids},
+                new_chunks=[chunk for chunk in chunks if chunk[0] not in old_ids],
+                stale_ids=sorted(old_ids.difference(new_ids)),
+            )
+
+    for key in set(manifest["files"]) - set(present):
+        summary["removed"] += 1
+        writer.update(key, None, stale_ids=manifest["files"][key]["chunks"])
+    writer.flush()
+
+    summary.update(
+        chunks_added=writer.added,
+        chunks_deleted=writer.deleted,
+        files=len(manifest["files"]),
+        collection_version=collection_version(manifest),
+        seconds=round(time.perf_counter() - start, 2),
+    )
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default=CATALOG_PATH)
+    parser.add_argument("--pdf-root", default=PDF_ROOT, help="directory the catalog's file_path values are relative to")
+    parser.add_argument("--store", default="astra", help="'astra' or local:<path.jsonl>")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml")
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_CHUNK_OVERLAP)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--reset", action="store_true", help="clear the store and the manifest, then ingest everything")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.store == "astra":
+        store = astra_store(args.secrets)
+    elif args.store.startswith("local:"):
+        store = LocalVectorStore(args.store[len("local:"):])
+    else:
+        parser.error("--store must be 'astra' or local:<path>")
+    summary = ingest(
+        store, args.catalog, args.pdf_root, args.manifest, args.store,
+        args.chunk_size, args.chunk_overlap, args.batch_size, args.workers, args.dry_run, args.reset,
+    )
+    print(json.dumps(summary, indent=2))
+    if summary["chunks_added"] or summary["chunks_deleted"]:
+        print(f"Collection changed: set [rag] COLLECTION_VERSION = \"{summary['collection_version']}\" to drop cached retrievals")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Process-wide gateway for OpenAI HTTP traffic.
+
+Every ChatOpenAI/OpenAIEmbeddings instance in the process shares one
+pooled httpx client whose transport:
+
+- rate limits requests and tokens per minute with token buckets, so bursts
+  queue instead of failing with 429s,
+- serves waiting calls by priority (answer generation before routing,
+  grading and background work),
+- coalesces identical in-flight non-streaming requests, so two sessions
+  grading the same chunk for the same question make one call,
+- pauses everyone when the provider does return a 429.
+
+A call that can't get capacity within max_wait_seconds, or before the
+deadline its caller set with llm_deadline(), gets a 429 marked
+not-retryable, which the OpenAI SDK raises as RateLimitError.
+
+Priority comes from a context variable set around graph nodes with
+llm_priority(); calls made outside any node run at BACKGROUND.
+"""
+import email.utils
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GENERATION, ROUTING, GRADING, BACKGROUND = range(4)
+PRIORITY_NAMES = {GENERATION: "generation", ROUTING: "routing", GRADING: "grading", BACKGROUND: "background"}
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200_000
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_WAIT_SECONDS = 120.0
+# Longest provider-requested pause honoured; a far-off Retry-After date shouldn't stall the app
+MAX_RETRY_AFTER_SECONDS = 60.0
+# Completion size assumed when a request doesn't cap it; corrected from the response's usage
+_DEFAULT_COMPLETION_TOKENS = 512
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+_priority: ContextVar = ContextVar("llm_priority", default=BACKGROUND)
+# time.monotonic() by which the caller stops waiting for the call; None when it waits as long as the gateway allows
+_deadline: ContextVar = ContextVar("llm_deadline", default=None)
+
+class GatewayBusy(RuntimeError):
+    """A call waited longer than max_wait_seconds for rate-limit capacity."""
+
+def is_rate_limit_error(error) -> bool:
+    """True for OpenAI SDK errors caused by a 429, from the provider or the gateway."""
+    return getattr(error, "status_code", None) == 429
+
+@contextmanager
+def llm_priority(priority):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+@contextmanager
+def llm_deadline(seconds):
+    """Calls made inside give up queueing for capacity once `seconds` have passed."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def retry_after_seconds(value, default=1.0):
+    """Seconds to pause from a Retry-After header, given as seconds or an HTTP date, clamped to [0, MAX_RETRY_AFTER_SECONDS]."""
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    if not math.isfinite(seconds):
+        return default
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+def prioritized(priority, fn):
+    """Wrap a graph node so the LLM calls it makes run at priority."""
+
+    def run(state):
+        with llm_priority(priority):
+            return fn(state)
+
+    return run
+
+class TokenBucket:
+    """Capacity refills continuously at capacity per minute; may go negative to record debt."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount):
+        # Requests larger than the whole bucket wait for a full bucket instead of forever
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed * 60.0 / self.capacity)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets with a priority queue of waiters."""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_wait_seconds=DEFAULT_MAX_WAIT_SECONDS):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_wait_seconds = max_wait_seconds
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+
+    def acquire(self, tokens, priority=BACKGROUND, deadline=None) -> float:
+        """Block until this call may go; returns seconds waited.
+
+        Gives up with GatewayBusy after max_wait_seconds, or at deadline
+        (a time.monotonic() value) if that comes first.
+        """
+        start = time.monotonic()
+        max_wait = self.max_wait_seconds if deadline is None else min(self.max_wait_seconds, deadline - start)
+        entry = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    wait = max(self._paused_until - now, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                    if self._waiters[0] == entry and wait <= 0:
+                        self.requests.level -= 1
+                        self.tokens.level -= tokens
+                        return now - start
+                    if now - start + max(wait, 0) > max_wait:
+                        raise GatewayBusy(f"LLM rate limit: waited {now - start:.0f}s for capacity")
+                    # Wake up by the deadline so a caller that stopped waiting leaves the queue
+                    timeout = wait if self._waiters[0] == entry and wait > 0 else 0.05
+                    self._condition.wait(timeout=min(timeout, max(start + max_wait - now, 0.0)))
+            finally:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                self._condition.notify_all()
+
+    def settle(self, estimated, actual) -> None:
+        """Correct the token bucket once the real usage is known."""
+        with self._condition:
+            self.tokens.level += estimated - actual
+
+    def pause(self, seconds) -> None:
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def queued(self) -> int:
+        with self._condition:
+            return len(self._waiters)
+
+class GatewayTransport(httpx.BaseTransport):
+    def __init__(self, gateway, transport):
+        self.gateway = gateway
+        self.transport = transport
+
+    def handle_request(self, request):
+        return self.gateway.send(request, self.transport)
+
+    def close(self):
+        self.transport.close()
+
+def _estimate_tokens(body):
+    if not isinstance(body, dict):
+        return 1
+    completion = body.get("max_completion_tokens") or body.get("max_tokens") or _DEFAULT_COMPLETION_TOKENS
+    prompt = json.dumps(body.get("messages") or body.get("input") or "")
+    return len(prompt) // 4 + (completion if "messages" in body else 0)
+
+def _copy_response(status_code, headers, content, request):
+    return httpx.Response(status_code, headers=headers, content=content, request=request)
+
+class LLMGateway:
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_connections=DEFAULT_MAX_CONNECTIONS, max_wait_seconds=DEFAULT_MAX_WAIT_SECONDS, timeout=60.0):
+        self.limiter = RateLimiter(rpm, tpm, max_wait_seconds)
+        pooled = httpx.HTTPTransport(limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections))
+        self.http_client = httpx.Client(transport=GatewayTransport(self, pooled), timeout=timeout)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._stats = {"requests": 0, "coalesced": 0, "rate_limited": 0, "rejected": 0, "wait_seconds": 0.0, "by_priority": {}}
+
+    def send(self, request, transport):
+        body = None
+        if request.method == "POST":
+            try:
+                body = json.loads(request.content)
+            except ValueError:
+                pass
+        # Streams can't be shared; everything else with an identical body can
+        key = None
+        if isinstance(body, dict) and not body.get("stream"):
+            key = hashlib.sha256(request.method.encode() + str(request.url).encode() + request.content).hexdigest()
+
+        if key is not None:
+            with self._lock:
+                leader = self._in_flight.get(key)
+                if leader is None:
+                    future = self._in_flight[key] = Future()
+            if leader is not None:
+                with self._lock:
+                    self._stats["coalesced"] += 1
+                return _copy_response(*leader.result(), request)
+            try:
+                status_code, headers, content = self._send(request, transport, body)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result((status_code, headers, content))
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+            return _copy_response(status_code, headers, content, request)
+        return self._send(request, transport, body, stream=True)
+
+    def _send(self, request, transport, body, stream=False):
+        priority = _priority.get()
+        estimated = _estimate_tokens(body)
+        try:
+            waited = self.limiter.acquire(estimated, priority, _deadline.get())
+        except GatewayBusy as e:
+            with self._lock:
+                self._stats["rejected"] += 1
+            # x-should-retry stops the SDK from queueing the call again
+            response = httpx.Response(
+                429,
+                headers={"x-should-retry": "false", "retry-after": "10"},
+                json={"error": {"message": str(e), "type": "rate_limit_error", "code": "gateway_busy"}},
+                request=request,
+            )
+            if stream:
+                return response
+            response.read()
+            headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in _DROPPED_HEADERS]
+            return response.status_code, headers, response.content
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["wait_seconds"] += waited
+            name = PRIORITY_NAMES.get(priority, str(priority))
+            self._stats["by_priority"][name] = self._stats["by_priority"].get(name, 0) + 1
+
+        response = transport.handle_request(request)
+        if response.status_code == 429:
+            retry_after = retry_after_seconds(response.headers.get("retry-after"))
+            logger.warning("Provider rate limit hit; pausing LLM calls for %.1fs", retry_after)
+            self.limiter.pause(retry_after)
+            with self._lock:
+                self._stats["rate_limited"] += 1
+        if stream:
+            return response
+
+        content = response.read()
+        response.close()
+        try:
+            usage = json.loads(content).get("usage") or {}
+            self.limiter.settle(estimated, usage.get("total_tokens", estimated))
+        except (ValueError, AttributeError):
+            pass
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in _DROPPED_HEADERS]
+        return response.status_code, headers, content
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {**self._stats, "by_priority": dict(self._stats["by_priority"])}
+        stats["queued"] = self.limiter.queued()
+        stats["in_flight_shared"] = len(self._in_flight)
+        return stats
+
+    def close(self):
+        self.http_client.close()
@@ -1,4 +1,7 @@
 import streamlit as st
+def is_admin() -> bool:
+    # ADMIN_EMAILS under [rag] in secrets.toml
+    return getattr(st.user, "email", None) in st.secrets.get("rag", {}).get("ADMIN_EMAILS", [])
 def menu()-> None:
     st.sidebar.image("images/logo.png")
     st.sidebar.header(f"Welcome, {st.user.name}!")
@@ -12,8 +15,13 @@ def menu()-> None:
     if st.session_state.current_page == 'chat':
         if st.sidebar.button("Reset Conversation"):
             st.session_state.messages = []
+            # Without a thread id (in the session or the URL) the chat page starts a new conversation thread
+            st.session_state.pop("thread_id", None)
+            st.query_params.pop("thread", None)
     st.sidebar.page_link("pages/about.py", label="About", icon="ℹ️")
     st.sidebar.page_link("pages/chat.py", label="Chat", icon="🤖")
     st.sidebar.page_link("pages/faq.py", label="FAQ", icon="❓")
     st.sidebar.page_link("pages/changelog.py", label="Changelog", icon="📜")
-    st.sidebar.page_link("pages/doc_catalog.py", label="Document Catalog", icon="📚")
\ No newline at end of file
+    st.sidebar.page_link("pages/doc_catalog.py", label="Document Catalog", icon="📚")
+    if is_admin():
+        st.sidebar.page_link("pages/metrics.py", label="Metrics", icon="📈")
\ No newline at end of file
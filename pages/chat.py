@@ -1,37 +1,51 @@
 import streamlit as st
 import os
-from langchain_openai import ChatOpenAI
-from langchain_astradb import AstraDBVectorStore
-from astrapy.info import VectorServiceOptions
-from urllib.parse import urlparse
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.output_parsers import JsonOutputParser
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Optional
+from typing import TypedDict, List, Optional, Annotated
 from pydantic import BaseModel, Field
 
-from astrapy import DataAPIClient
 from menu import menu
+from auth import is_authorized_user
+from resources import get_prerouter, get_trace_sink
+from startup import timed, warm_imports
+from grading import grade_concurrently, grade_in_batch, DEFAULT_MAX_CONCURRENCY, DEFAULT_TIMEOUT
+from budget import RequestBudget, charge, DEFAULT_MAX_REWRITES, DEFAULT_DEADLINE_SECONDS, DEFAULT_MAX_LLM_CALLS
+from grounding import local_hallucination_check
+from context_packer import pack_context, context_stats, DEFAULT_MAX_TOKENS as DEFAULT_CONTEXT_TOKENS
+from references import ChunkTextCache, Reference, references_markdown
+from speculation import SpeculationStats, DEFAULT_MAX_SPECULATIONS
+from history import ChatHistoryManager, RollingSummary, DEFAULT_KEEP_TURNS, DEFAULT_MAX_TOKENS as DEFAULT_HISTORY_TOKENS
+from concurrent.futures import ThreadPoolExecutor
+# Retrieval, caching, gateway, tracing and checkpoint modules (NumPy among them) are
+# imported by the get_* factories and the graph builder, so the first render skips them
+import contextvars
+import logging
+import threading
 import uuid
 from datetime import datetime
 import time
-if "toast_shown" not in st.session_state:
-    st.session_state.toast_shown = False
-if not st.session_state.toast_shown:
-    st.toast(f"From Kyle: Hi {st.user.get('name')}. For research purposes, your queries may be recorded and analyzed. I appreciate your understanding as I learn to figure out how to make this application more useful. I may contact you to learn more about your use case to apply more advanced features. ", icon="🔎")
-    st.session_state.toast_shown = True
-    time.sleep(10)
+
+logger = logging.getLogger(__name__)
+
+if "notice_dismissed" not in st.session_state:
+    st.session_state.notice_dismissed = False
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "current_page" not in st.session_state:
     st.session_state.current_page = "chat"
-if "session_id" not in st.session_state:
-    st.session_state.session_id = str(uuid.uuid4())
+if "chat_history" not in st.session_state:
+    st.session_state.chat_history = []
+if "history_summary" not in st.session_state:
+    st.session_state.history_summary = RollingSummary()
 
 @st.cache_resource(show_spinner=False)
 def get_vector_store():
+    with timed("import langchain_astradb"):
+        from langchain_astradb import AstraDBVectorStore
+        from astrapy.info import VectorServiceOptions
     secrets = st.secrets
     vector_store = AstraDBVectorStore(
         collection_name=secrets["astra"]["ASTRA_COLLECTION_NAME"],
@@ -48,38 +62,222 @@ def get_vector_store():
 
 @st.cache_resource(show_spinner=False)
 def get_query_store():
+    from astrapy import DataAPIClient
     secrets = st.secrets
     client = DataAPIClient(secrets['astra']['ASTRA_COLLECTION_USERNAME_TOKEN'])
     db = client.get_database_by_api_endpoint(secrets['astra']['ASTRA_DB_API_ENDPOINT'])
     table = db.get_table(secrets['astra']['ASTRA_QUERY_DB'])
     return table
 
+@st.cache_resource(show_spinner=False)
+def get_query_writer():
+    from query_log import QueryLogWriter
+    settings = st.secrets.get("rag", {})
+    return QueryLogWriter(
+        get_query_store(),
+        spill_path=settings.get("QUERY_LOG_SPILL_PATH") or None,
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_llm_gateway(rpm, tpm, max_connections):
+    from llm_gateway import LLMGateway
+    return LLMGateway(rpm=rpm, tpm=tpm, max_connections=max_connections)
+
+def gateway_settings(rag_settings):
+    """(requests per minute, tokens per minute, max connections) of the shared LLM gateway."""
+    from llm_gateway import DEFAULT_RPM, DEFAULT_TPM, DEFAULT_MAX_CONNECTIONS
+    return (
+        int(rag_settings.get("LLM_RPM", DEFAULT_RPM)),
+        int(rag_settings.get("LLM_TPM", DEFAULT_TPM)),
+        int(rag_settings.get("LLM_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+    )
+
+def llm_http_client(gateway_options):
+    """The process-wide pooled, rate-limited HTTP client for OpenAI calls."""
+    return get_llm_gateway(*gateway_options).http_client
+
+@st.cache_resource(show_spinner=False)
+def get_chat_model(gateway_options):
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        temperature=0,
+        openai_api_key=st.secrets['openai']["OPENAI_API_KEY"],
+        model=st.secrets["openai"]["OPENAI_MODEL"],
+        base_url=st.secrets["openai"].get("OPENAI_BASE_URL") or None,
+        http_client=llm_http_client(gateway_options),
+        # Token usage on streamed answers too, for per-node tracing
+        stream_usage=True,
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_answer_cache(max_entries, ttl_seconds, similarity_threshold, gateway_options):
+    from langchain_openai import OpenAIEmbeddings
+    from answer_cache import SemanticAnswerCache
+    secrets = st.secrets
+    embeddings = OpenAIEmbeddings(
+        model=secrets["openai"]["OPENAI_TEXT_EMBEDDING_MODEL"],
+        openai_api_key=secrets["openai"]["OPENAI_API_KEY"],
+        base_url=secrets["openai"].get("OPENAI_BASE_URL") or None,
+        http_client=llm_http_client(gateway_options),
+    )
+    return SemanticAnswerCache(
+        embed_query=embeddings.embed_query,
+        max_entries=max_entries,
+        ttl_seconds=ttl_seconds,
+        similarity_threshold=similarity_threshold,
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_retrieval_cache():
+    from retrieval_cache import RetrievalCache
+    return RetrievalCache()
+
+@st.cache_resource(show_spinner=False)
+def get_retriever(collection_version=None, bm25_index=None):
+    """The retriever the graph searches with, built once per combination of settings.
+
+    Vector search sits behind the shared retrieval cache unless
+    collection_version is None, and is fused with BM25 when bm25_index is a
+    (path, built at) pair from bm25_index_settings.
+    """
+    retriever = get_vector_store().as_retriever(
+        search_type="similarity_score_threshold",
+        search_kwargs={"score_threshold": 0.4, "k": 15}
+    )
+    if collection_version is not None:
+        from retrieval_cache import CachedRetriever
+        # Bump COLLECTION_VERSION after re-ingesting to drop stale results
+        retrieval_cache = get_retrieval_cache()
+        retrieval_cache.ensure_version(collection_version)
+        retriever = CachedRetriever(retriever, retrieval_cache)
+    if bm25_index is not None:
+        from bm25 import HybridRetriever
+        # Exact identifiers ("BCO 13-6") come from BM25; fused with vector results by rank
+        retriever = HybridRetriever(retriever, get_bm25_index(*bm25_index), k=15)
+    return retriever
+
+@st.cache_resource(show_spinner=False)
+def get_background_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="background")
+
+@st.cache_resource(show_spinner=False)
+def get_bm25_index(path, built_at):
+    # built_at only keys the cache, so a rebuilt index is loaded
+    with timed("load BM25 index"):
+        from bm25 import BM25Index
+        return BM25Index.load(path)
+
+@st.cache_resource(show_spinner=False)
+def get_chunk_cache():
+    def fetch(document_id):
+        doc = get_vector_store().get_by_document_id(document_id)
+        return doc.page_content if doc is not None else None
+    return ChunkTextCache(fetch=fetch)
+
+@st.cache_resource(show_spinner=False)
+def get_speculation_stats():
+    return SpeculationStats()
+
+@st.cache_resource(show_spinner=False)
+def get_reranker(threshold, lexical_weight):
+    from reranker import LocalReranker
+    return LocalReranker(threshold=threshold, lexical_weight=lexical_weight)
+
+@st.cache_resource(show_spinner=False)
+def get_checkpointer(path, max_idle_seconds):
+    from checkpoints import SQLiteCheckpointSaver
+    # Both grow by appending, so each item is stored once rather than in every checkpoint
+    return SQLiteCheckpointSaver(path, max_idle_seconds=max_idle_seconds, append_only_channels=("messages", "quality_checks"))
+
+@st.cache_resource(show_spinner=False)
+def get_thread_update_lock():
+    # update_state reads the latest checkpoint and writes the next; two at once on a thread would drop one
+    return threading.Lock()
+
 class GradeDocuments(BaseModel):
     score: str = Field(description="Binary score 'yes' or 'no' for document relevance")
     relevance_score: float = Field(description="Relevance score from 0.0 to 1.0")
     reasoning: str = Field(description="Brief explanation of the relevance decision")
 
+class DocumentGrade(GradeDocuments):
+    index: int = Field(description="Number of the document being graded, as given in the prompt")
+
+class BatchGradeDocuments(BaseModel):
+    grades: List[DocumentGrade] = Field(description="One grade per document")
+
 class QueryRouter(BaseModel):
     needs_retrieval: bool = Field(description="Whether the query needs document retrieval")
     query_type: str = Field(description="Type of query: pca_specific, general_theology, greeting, meta")
     reasoning: str = Field(description="Brief explanation of routing decision")
 
+class QueryPlan(BaseModel):
+    needs_retrieval: bool = Field(description="Whether the query needs document retrieval")
+    query_type: str = Field(description="Type of query: pca_specific, general_theology, greeting, meta")
+    rewritten_query: str = Field(description="The question rewritten for searching PCA documents")
+    sub_queries: List[str] = Field(default_factory=list, description="Up to 3 alternative search queries for other aspects of the question; empty if not needed")
+    reasoning: str = Field(description="Brief explanation of the plan")
+
 class HallucinationCheck(BaseModel):
     is_grounded: bool = Field(description="Whether the response is grounded in provided documents")
     confidence: float = Field(description="Confidence score from 0.0 to 1.0")
     issues: str = Field(description="Any hallucination concerns identified")
 
+def append_messages(existing, new):
+    """Reducer for the conversation: appends new messages, skipping ones already in it.
+
+    Nodes that return the whole state hand back the existing messages too;
+    ids (given on first append, as LangGraph's add_messages does) tell them apart.
+    """
+    existing = existing or []
+    for message in existing:
+        if message.id is None:
+            message.id = str(uuid.uuid4())
+    known = {message.id for message in existing}
+    added = []
+    for message in new or []:
+        if message.id is None:
+            message.id = str(uuid.uuid4())
+        if message.id not in known:
+            known.add(message.id)
+            added.append(message)
+    return existing + added if added else existing
+
+def append_verdicts(existing, new):
+    """Reducer for final quality checks: appends one verdict per answer, keyed by its message id."""
+    existing = existing or []
+    known = {verdict["message_id"] for verdict in existing}
+    added = []
+    for verdict in new or []:
+        if verdict["message_id"] not in known:
+            known.add(verdict["message_id"])
+            added.append(verdict)
+    return existing + added if added else existing
+
 class GraphState(TypedDict, total=False):
+    # The conversation; each run adds only the turn's new messages to the thread's checkpoint
+    messages: Annotated[List, append_messages]
+    # RollingSummary.snapshot() as of the last turn, so a resumed session doesn't re-summarize from scratch
+    history_summary: dict
+    # Background LLM verdicts on answers saved with an interim local check, so a resumed session shows the final one
+    quality_checks: Annotated[List, append_verdicts]
     question: str
     generation: str
     documents: List
+    embeddings: List
     chat_history: List
     routing: dict
     hallucination_check: dict
+    metrics: dict
+    budget: dict
+    context: str
+    request_id: str
+    speculative: dict
+    plan: dict
 
-def grade_and_rank_documents(state: GraphState, llm) -> GraphState:
+def grade_and_rank_documents(state: GraphState, llm, mode="concurrent", max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT, diversity_method="jaccard", reranker=None) -> GraphState:
     question = state["question"]
     documents = state["documents"]
+    embeddings = state.get("embeddings") or []
     
     grade_prompt = ChatPromptTemplate.from_template("""
     You are a document relevance grader for Presbyterian Church in America (PCA) queries.
@@ -95,57 +293,84 @@ def grade_and_rank_documents(state: GraphState, llm) -> GraphState:
     Provide: binary score ('yes'/'no'), relevance_score (0.0-1.0), and brief reasoning.
     """)
     
-    grader = grade_prompt | llm.with_structured_output(GradeDocuments)
+    batch_grade_prompt = ChatPromptTemplate.from_template("""
+    You are a document relevance grader for Presbyterian Church in America (PCA) queries.
+    
+    Question: {question}
+    
+    {documents}
+    
+    Evaluate each numbered document's relevance to the question:
+    1. Does it contain information directly related to the question?
+    2. How specific and useful is the information?
+    3. Rate relevance from 0.0 (irrelevant) to 1.0 (highly relevant)
+    
+    For every document provide: index (the document number), binary score ('yes'/'no'), relevance_score (0.0-1.0), and brief reasoning.
+    """)
+    
+    start = time.perf_counter()
+    grades = None
+    llm_calls = 0
+    if mode == "local":
+        # Scored on this machine; no LLM calls
+        if reranker is None:
+            from reranker import LocalReranker
+            reranker = LocalReranker()
+        grades = reranker.grade(question, documents)
+    elif mode == "batched" and documents:
+        batch_grader = batch_grade_prompt | llm.with_structured_output(BatchGradeDocuments)
+        llm_calls += 1
+        try:
+            grades = grade_in_batch(batch_grader, question, documents, timeout=timeout)
+        except Exception as e:
+            logger.warning("Batched grading failed, falling back to per-document grading: %s", e)
+    if grades is None:
+        grader = grade_prompt | llm.with_structured_output(GradeDocuments)
+        payloads = [{"question": question, "document": doc.page_content} for doc in documents]
+        llm_calls += len(payloads)
+        grades = grade_concurrently(grader, payloads, max_concurrency=max_concurrency, timeout=timeout)
+    elapsed = time.perf_counter() - start
     
     scored_docs = []
-    for doc in documents:
-        grade = grader.invoke({"question": question, "document": doc.page_content})
-        if grade.score == "yes" and grade.relevance_score > 0.3:
+    for i, (doc, grade) in enumerate(zip(documents, grades)):
+        if grade is not None and grade.score == "yes" and grade.relevance_score > 0.3:
             scored_docs.append({
                 "doc": doc,
                 "score": grade.relevance_score,
-                "reasoning": grade.reasoning
+                "reasoning": grade.reasoning,
+                "embedding": embeddings[i] if len(embeddings) == len(documents) else None
             })
     
     # Rank by relevance score
     scored_docs.sort(key=lambda x: x["score"], reverse=True)
     
     # Apply diversity filtering
-    filtered_docs = apply_diversity_filter(scored_docs, question)
+    filtered_docs = apply_diversity_filter(scored_docs, question, method=diversity_method)
     
-    return {"question": question, "documents": filtered_docs, "chat_history": state["chat_history"]}
+    failed = sum(1 for grade in grades if grade is None)
+    logger.info("Graded %d documents in %.2fs (mode=%s, failed=%d, kept=%d)", len(documents), elapsed, mode, failed, len(filtered_docs))
+    metrics = dict(state.get("metrics") or {})
+    metrics["grading"] = {
+        "mode": mode,
+        "seconds": elapsed,
+        "graded": len(documents),
+        "failed": failed,
+        "relevant": len(scored_docs),
+        "llm_calls": llm_calls,
+    }
+    
+    return {"question": question, "documents": filtered_docs, "embeddings": [], "chat_history": state["chat_history"], "metrics": metrics, "budget": charge(state, llm_calls=llm_calls)}
 
-def apply_diversity_filter(scored_docs, question, max_docs=8, similarity_threshold=0.7):
+def apply_diversity_filter(scored_docs, question, max_docs=8, similarity_threshold=0.7, method="jaccard", lambda_mult=None):
     if not scored_docs:
         return []
     
-    diverse_docs = [scored_docs[0]["doc"]]  # Always include top doc
-    
-    for candidate in scored_docs[1:]:
-        if len(diverse_docs) >= max_docs:
-            break
-            
-        # Check content similarity with already selected docs
-        is_diverse = True
-        candidate_content = candidate["doc"].page_content.lower()
-        
-        for selected_doc in diverse_docs:
-            selected_content = selected_doc.page_content.lower()
-            
-            # Simple diversity check based on content overlap
-            common_words = set(candidate_content.split()) & set(selected_content.split())
-            total_words = len(set(candidate_content.split()) | set(selected_content.split()))
-            
-            if total_words > 0:
-                similarity = len(common_words) / total_words
-                if similarity > similarity_threshold:
-                    is_diverse = False
-                    break
-        
-        if is_diverse:
-            diverse_docs.append(candidate["doc"])
+    from diversity import jaccard_select, mmr_select, DEFAULT_MMR_LAMBDA
+    # MMR needs vectors; candidates without one (BM25-only hits) are compared by word overlap
+    if method == "mmr" and any(candidate.get("embedding") is not None for candidate in scored_docs):
+        return mmr_select(scored_docs, max_docs, DEFAULT_MMR_LAMBDA if lambda_mult is None else lambda_mult)
     
-    return diverse_docs
+    return jaccard_select(scored_docs, max_docs, similarity_threshold)
 
 def rewrite_query(state: GraphState, llm) -> GraphState:
     question = state["question"]
@@ -168,7 +393,7 @@ def rewrite_query(state: GraphState, llm) -> GraphState:
     rewriter = rewrite_prompt | llm
     rewritten_question = rewriter.invoke({"question": question, "chat_history": chat_history})
     
-    return {"question": rewritten_question.content, "documents": state["documents"], "chat_history": chat_history}
+    return {"question": rewritten_question.content, "documents": state["documents"], "chat_history": chat_history, "budget": charge(state, llm_calls=1, rewrites=1)}
 
 def route_query(state: GraphState, llm) -> GraphState:
     question = state["question"]
@@ -204,14 +429,76 @@ def route_query(state: GraphState, llm) -> GraphState:
     router = router_prompt | llm.with_structured_output(QueryRouter)
     result = router.invoke({"question": question})
     
+    state["budget"] = charge(state, llm_calls=1)
+    state["routing"] = {
+        "needs_retrieval": result.needs_retrieval,
+        "query_type": result.query_type,
+        "reasoning": result.reasoning
+    }
+    
+    return state
+
+MAX_SUB_QUERIES = 3
+GRAPH_TOPOLOGIES = ("router", "planner")
+
+def plan_query(state: GraphState, llm) -> GraphState:
+    """Route, classify and rewrite in one structured call (the "planner" topology)."""
+    question = state["question"]
+    chat_history = state["chat_history"]
+    
+    planner_prompt = ChatPromptTemplate.from_template("""
+    You are the query planner for a Presbyterian Church in America (PCA) knowledge system.
+    
+    User query: "{question}"
+    Chat history: {chat_history}
+    
+    1. Decide whether the query needs document retrieval.
+    Answer directly WITHOUT retrieval for greetings, casual conversation, meta questions about the system, general theology that doesn't need PCA-specific documents, and off-topic questions.
+    Use retrieval for specific PCA policies, procedures or rulings, Book of Church Order (BCO) questions, Standing Judicial Commission (SJC) cases, General Assembly minutes, reports or overtures, presbytery procedures, historical PCA documents, PCA confessional positions and Westminster Confession of Faith questions.
+    
+    2. Classify the query_type: "greeting", "general_theology", "pca_specific", or "meta".
+    
+    3. Write rewritten_query: the question made specific for searching PCA documents. Add PCA/Presbyterian context if missing, use specific terminology (e.g., "BCO" for Book of Church Order), keep exact citations such as "BCO 13-6" or "SJC 2019-07", and resolve references to the chat history.
+    
+    4. If the question has distinct parts, add up to 3 sub_queries, one per part. Otherwise leave sub_queries empty.
+    
+    Respond with JSON containing needs_retrieval, query_type, rewritten_query, sub_queries and reasoning.
+    """)
+    
+    planner = planner_prompt | llm.with_structured_output(QueryPlan)
+    result = planner.invoke({"question": question, "chat_history": chat_history})
+    
+    queries = [result.rewritten_query.strip() or question]
+    for sub_query in result.sub_queries[:MAX_SUB_QUERIES]:
+        if sub_query.strip() and sub_query.strip() not in queries:
+            queries.append(sub_query.strip())
+    
+    state["budget"] = charge(state, llm_calls=1)
     state["routing"] = {
         "needs_retrieval": result.needs_retrieval,
         "query_type": result.query_type,
         "reasoning": result.reasoning
     }
+    # The answer is still written for the user's question; only retrieval uses these
+    state["plan"] = {"question": question, "queries": queries}
     
     return state
 
+def summarize_history(llm, previous_summary, new_messages):
+    summary_prompt = ChatPromptTemplate.from_template("""
+    You maintain a running summary of a conversation between a user and ClerkGPT, an assistant for Presbyterian Church in America (PCA) questions.
+    
+    Current summary: {summary}
+    
+    New messages:
+    {messages}
+    
+    Update the summary to include the new messages. Keep the questions asked, the key facts and citations given (BCO sections, SJC cases, GA actions), and anything later questions might refer back to.
+    Keep it under 200 words. Return only the updated summary.
+    """)
+    summarizer = summary_prompt | llm
+    return summarizer.invoke({"summary": previous_summary or "(none)", "messages": new_messages}).content
+
 def check_hallucination(state: GraphState, llm) -> GraphState:
     question = state["question"]
     generation = state["generation"]
@@ -226,7 +513,8 @@ def check_hallucination(state: GraphState, llm) -> GraphState:
         }
         return state
     
-    context = "\n\n".join([doc.page_content for doc in documents])
+    # Reuse the context generate_answer packed, so the checker sees exactly what the model saw
+    context = state.get("context") or pack_context(documents)
     
     hallucination_prompt = ChatPromptTemplate.from_template("""
     You are a fact-checker analyzing whether an AI response is properly grounded in the provided source documents.
@@ -254,6 +542,7 @@ def check_hallucination(state: GraphState, llm) -> GraphState:
         "context": context
     })
     
+    state["budget"] = charge(state, llm_calls=1)
     state["hallucination_check"] = {
         "is_grounded": result.is_grounded,
         "confidence": result.confidence,
@@ -263,11 +552,86 @@ def check_hallucination(state: GraphState, llm) -> GraphState:
     return state
 
 @st.cache_resource(show_spinner=False)
-def create_agentic_rag_chain(_chat_llm, _retriever):
+def create_agentic_rag_chain(_chat_llm, _retriever, grading_mode="concurrent", grading_concurrency=DEFAULT_MAX_CONCURRENCY, grading_timeout=DEFAULT_TIMEOUT, diversity_method="jaccard", prerouter_enabled=False, prerouter_canned_replies=True, budget=RequestBudget(), hallucination_mode="tiered", context_max_tokens=DEFAULT_CONTEXT_TOKENS, trace_path=None, speculative_mode="off", max_speculations=DEFAULT_MAX_SPECULATIONS, _speculation_stats=None, topology="router", rerank_options=None, checkpoint_options=None, retriever_options=None, gateway_options=None):
+    with timed("import langgraph"):
+        from langgraph.graph import StateGraph, END
+    with timed("import pipeline modules"):
+        from bm25 import reciprocal_rank_fusion, document_key
+        from diversity import retrieve_with_embeddings
+        from llm_gateway import prioritized, llm_priority, GENERATION, ROUTING, GRADING
+        from prerouter import CANNED_REPLIES
+        from tracing import traced
+    
+    # LLM gateway priority per graph node; anything else runs at ROUTING
+    node_priorities = {"generate": GENERATION, "generate_direct": GENERATION, "retrieve": GRADING, "grade_documents": GRADING, "check_hallucination": GRADING}
+    prerouter = get_prerouter(prerouter_canned_replies) if prerouter_enabled else None
+    # No path means tracing is off
+    trace_sink = get_trace_sink(trace_path) if trace_path else None
+    checkpointer = get_checkpointer(*checkpoint_options) if checkpoint_options else None
+    
+    def preroute(state: GraphState) -> GraphState:
+        return {"routing": prerouter.route(state["question"]) or {}, "budget": charge(state)}
+    
+    def preroute_decision(state: GraphState) -> str:
+        routing = state.get("routing", {})
+        if routing.get("source") != "prerouter":
+            return "route"
+        if prerouter.canned_replies and routing.get("intent") in CANNED_REPLIES:
+            return "canned_reply"
+        return "generate_direct"
+    
+    def canned_reply(state: GraphState) -> GraphState:
+        reply = CANNED_REPLIES[state["routing"]["intent"]]
+        return {"documents": [], "generation": reply, "hallucination_check": {}}
+    
+    def check_grounding(state: GraphState) -> GraphState:
+        # Local tier only; ambiguous answers are marked pending and verified by the LLM after display
+        if not state["documents"]:
+            return check_hallucination(state, _chat_llm)
+        return {"hallucination_check": local_hallucination_check(state["generation"], state["documents"])}
+    
+    def search(query):
+        if diversity_method == "mmr":
+            # Hybrid retrieval keeps its BM25 results and has vectors for the dense ones
+            if hasattr(_retriever, "invoke_with_embeddings"):
+                return _retriever.invoke_with_embeddings(query)
+            if getattr(_retriever, "vectorstore", None) is not None:
+                return retrieve_with_embeddings(_retriever, query)
+        return _retriever.invoke(query), []
+    
+    def search_all(queries, extra_results=()):
+        """Run queries concurrently and merge them by reciprocal rank, keeping embeddings aligned."""
+        # A pool per request, so fan-out scales with concurrent sessions instead of queueing on the shared graph;
+        # the first query runs on this thread
+        with ThreadPoolExecutor(max_workers=max(1, len(queries) - 1), thread_name_prefix="sub-query") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, search, query) for query in queries[1:]]
+            results = [search(query) for query in queries[:1]] + [future.result() for future in futures]
+        results += list(extra_results)
+        k = getattr(_retriever, "search_kwargs", {}).get("k", 15)
+        docs = reciprocal_rank_fusion([result_docs for result_docs, _ in results], k=k)
+        vectors = {}
+        for result_docs, result_embeddings in results:
+            if len(result_embeddings) == len(result_docs):
+                vectors.update((document_key(doc), vector) for doc, vector in zip(result_docs, result_embeddings))
+        embeddings = [vectors.get(document_key(doc)) for doc in docs]
+        return docs, embeddings if any(vector is not None for vector in embeddings) else []
+    
     def retrieve_docs(state: GraphState) -> GraphState:
         question = state["question"]
-        docs = _retriever.invoke(question)
-        return {"question": question, "documents": docs, "chat_history": state["chat_history"]}
+        speculative = state.get("speculative") or {}
+        plan = state.get("plan") or {}
+        if plan.get("question") == question and topology == "planner":
+            # Planned queries run once, on the first retrieval for this question
+            extra = []
+            if speculative.get("retrieval") and speculative["question"] == question:
+                extra = [(speculative["retrieval"]["documents"], speculative["retrieval"]["embeddings"])]
+            docs, embeddings = search_all(plan["queries"], extra)
+            return {"question": question, "documents": docs, "embeddings": embeddings, "chat_history": state["chat_history"], "plan": {}, "speculative": {}}
+        if speculative.get("retrieval") and speculative["question"] == question:
+            # Already fetched while the router was deciding
+            return {**speculative["retrieval"], "speculative": {**speculative, "retrieval": None}}
+        docs, embeddings = search(question)
+        return {"question": question, "documents": docs, "embeddings": embeddings, "chat_history": state["chat_history"]}
     
     def generate_answer(state: GraphState) -> GraphState:
         question = state["question"]
@@ -289,7 +653,7 @@ def create_agentic_rag_chain(_chat_llm, _retriever):
                 "chat_history": chat_history
             })
         else:
-            context = "\n\n".join([doc.page_content for doc in documents])
+            context = pack_context(documents, max_tokens=context_max_tokens)
             prompt = ChatPromptTemplate.from_template("""
             You are a helpful and theologically-informed research assistant for the Presbyterian Church in America (PCA).
             
@@ -306,23 +670,127 @@ def create_agentic_rag_chain(_chat_llm, _retriever):
                 "chat_history": chat_history
             })
         
-        return {"question": question, "documents": documents, "generation": response.content, "chat_history": chat_history}
+        update = {"question": question, "documents": documents, "generation": response.content, "chat_history": chat_history, "budget": charge(state, llm_calls=1)}
+        if documents:
+            update["context"] = context
+            metrics = dict(state.get("metrics") or {})
+            metrics["context"] = context_stats(documents, context)
+            update["metrics"] = metrics
+        return update
     
     def route_decision(state: GraphState) -> str:
         routing = state.get("routing", {})
         needs_retrieval = routing.get("needs_retrieval", False)
         
-        # Debug logging
-        print(f"Routing decision: needs_retrieval={needs_retrieval}, query_type={routing.get('query_type', 'unknown')}")
+        logger.debug("Routing decision: needs_retrieval=%s, query_type=%s", needs_retrieval, routing.get("query_type", "unknown"))
         
         if needs_retrieval:
             return "retrieve"
         else:
             return "generate_direct"
     
+    # (threshold, lexical weight); None grades with the reranker's defaults
+    reranker = get_reranker(*rerank_options) if grading_mode == "local" and rerank_options else None
+    
+    def grade(state):
+        return grade_and_rank_documents(
+            state,
+            _chat_llm,
+            mode=grading_mode,
+            max_concurrency=grading_concurrency,
+            timeout=grading_timeout,
+            diversity_method=diversity_method,
+            reranker=reranker,
+        )
+    
+    # The planner topology routes and rewrites in one call
+    decide = plan_query if topology == "planner" else route_query
+    speculation_stats = _speculation_stats if _speculation_stats is not None else SpeculationStats()
+    speculation_pool = ThreadPoolExecutor(max_workers=max_speculations, thread_name_prefix="speculative") if speculative_mode != "off" else None
+    speculation_slots = threading.BoundedSemaphore(max_speculations)
+    # Speculative grading is still grading; its span and LLM calls belong to that node
+    grade_speculatively = traced("grade_documents", grade, trace_sink) if trace_sink is not None else grade
+    
+    def speculate(state):
+        start = time.perf_counter()
+        retrieval = retrieve_docs(state)
+        # Planned queries replace this retrieval, so grading it would be wasted
+        grading = None
+        if speculative_mode == "grade" and topology != "planner":
+            with llm_priority(GRADING):
+                grading = grade_speculatively({**state, **retrieval, "metrics": {}, "budget": {}})
+        return {"question": state["question"], "retrieval": retrieval, "grading": grading, "seconds": time.perf_counter() - start}
+    
+    def record_waste(future):
+        if not future.cancelled() and future.exception() is None:
+            grading = future.result()["grading"]
+            speculation_stats.record_waste(1, grading["metrics"]["grading"]["llm_calls"] if grading else 0)
+    
+    def route(state: GraphState) -> GraphState:
+        if speculation_pool is None:
+            return decide(state, _chat_llm)
+        # Most questions end up retrieving, so start the search before the router answers
+        if not speculation_slots.acquire(blocking=False):
+            # Queued behind other sessions' speculation it would land after the router anyway
+            speculation_stats.record_skipped()
+            update = decide(state, _chat_llm)
+            update["metrics"] = {**(update.get("metrics") or {}), "speculation": {"mode": speculative_mode, "used": False, "skipped": True}}
+            return update
+        spec_state = {"question": state["question"], "chat_history": state["chat_history"], "documents": [], "embeddings": [], "request_id": state.get("request_id", "")}
+        future = speculation_pool.submit(contextvars.copy_context().run, speculate, spec_state)
+        future.add_done_callback(lambda _: speculation_slots.release())
+        start = time.perf_counter()
+        try:
+            update = decide(state, _chat_llm)
+        except Exception:
+            future.cancel()
+            raise
+        router_seconds = time.perf_counter() - start
+        
+        metrics = dict(update.get("metrics") or {})
+        if update["routing"].get("needs_retrieval"):
+            try:
+                speculative = future.result()
+            except Exception as e:
+                logger.warning("Speculative retrieval failed, retrieving normally: %s", e)
+                speculative = {}
+            if speculative:
+                grading_calls = speculative["grading"]["metrics"]["grading"]["llm_calls"] if speculative["grading"] else 0
+                update["budget"] = charge(update, llm_calls=grading_calls)
+                overlap = min(router_seconds, speculative["seconds"])
+                speculation_stats.record_used(overlap)
+                metrics["speculation"] = {"mode": speculative_mode, "used": True, "grading_calls": grading_calls, "overlap_seconds": overlap}
+            update["speculative"] = speculative
+        else:
+            cancelled = future.cancel()
+            speculation_stats.record_discarded(cancelled)
+            if not cancelled:
+                future.add_done_callback(record_waste)
+            metrics["speculation"] = {"mode": speculative_mode, "used": False, "cancelled": cancelled}
+        update["metrics"] = metrics
+        return update
+    
+    def grade_documents(state: GraphState) -> GraphState:
+        speculative = state.get("speculative") or {}
+        if speculative.get("grading") and speculative["question"] == state["question"]:
+            # Graded while the router was deciding; the calls were charged in route
+            update = {**speculative["grading"], "budget": dict(state.get("budget") or {}), "speculative": {}}
+            update["metrics"] = {**(state.get("metrics") or {}), "grading": speculative["grading"]["metrics"]["grading"]}
+        else:
+            update = grade(state)
+        if not update["documents"]:
+            # Another pass costs a rewrite plus grading roughly as many documents again
+            next_iteration_calls = 1 + update["metrics"]["grading"]["llm_calls"]
+            exhausted = budget.exhausted(update["budget"], next_iteration_calls)
+            if exhausted:
+                logger.info("Request budget exhausted (%s): %s", exhausted, update["budget"])
+                update["budget"]["exhausted"] = exhausted
+        return update
+    
     def decide_to_generate(state: GraphState) -> str:
         documents = state["documents"]
-        if documents:
+        # Out of budget: answer from the "no relevant documents" branch instead of looping
+        if documents or state.get("budget", {}).get("exhausted"):
             return "generate"
         else:
             return "rewrite"
@@ -358,23 +826,51 @@ def create_agentic_rag_chain(_chat_llm, _retriever):
             "chat_history": chat_history
         })
         
-        return {"question": question, "documents": [], "generation": response.content, "chat_history": chat_history, "routing": state.get("routing", {}), "hallucination_check": {}}
+        return {"question": question, "documents": [], "generation": response.content, "chat_history": chat_history, "routing": state.get("routing", {}), "hallucination_check": {}, "budget": charge(state, llm_calls=1)}
     
     workflow = StateGraph(GraphState)
     
+    def add_node(name, node):
+        # Answer generation jumps the LLM gateway queue ahead of grading and routing
+        node = prioritized(node_priorities.get(name, ROUTING), node)
+        # Every node writes a latency/token span when tracing is on
+        workflow.add_node(name, traced(name, node, trace_sink) if trace_sink is not None else node)
+    
     # Add all nodes
-    workflow.add_node("route", lambda state: route_query(state, _chat_llm))
-    workflow.add_node("retrieve", retrieve_docs)
-    workflow.add_node("grade_documents", lambda state: grade_and_rank_documents(state, _chat_llm))
-    workflow.add_node("generate", generate_answer)
-    workflow.add_node("generate_direct", generate_direct_answer)
-    workflow.add_node("rewrite", lambda state: rewrite_query(state, _chat_llm))
-    workflow.add_node("check_hallucination", lambda state: check_hallucination(state, _chat_llm))
+    if prerouter is not None:
+        add_node("preroute", preroute)
+        add_node("canned_reply", canned_reply)
+    # Named after what it does so traces from the two topologies can be compared
+    route_node = "plan" if topology == "planner" else "route"
+    add_node(route_node, route)
+    add_node("retrieve", retrieve_docs)
+    add_node("grade_documents", grade_documents)
+    add_node("generate", generate_answer)
+    add_node("generate_direct", generate_direct_answer)
+    add_node("rewrite", lambda state: rewrite_query(state, _chat_llm))
+    if hallucination_mode == "tiered":
+        add_node("check_hallucination", check_grounding)
+    else:
+        add_node("check_hallucination", lambda state: check_hallucination(state, _chat_llm))
     
     # Set entry point and edges
-    workflow.set_entry_point("route")
+    if prerouter is not None:
+        # Obvious greetings and meta questions skip the router LLM
+        workflow.set_entry_point("preroute")
+        workflow.add_conditional_edges(
+            "preroute",
+            preroute_decision,
+            {
+                "route": route_node,
+                "generate_direct": "generate_direct",
+                "canned_reply": "canned_reply",
+            }
+        )
+        workflow.add_edge("canned_reply", END)
+    else:
+        workflow.set_entry_point(route_node)
     workflow.add_conditional_edges(
-        "route",
+        route_node,
         route_decision,
         {
             "retrieve": "retrieve",
@@ -392,68 +888,280 @@ def create_agentic_rag_chain(_chat_llm, _retriever):
     )
     workflow.add_edge("rewrite", "retrieve")
     workflow.add_edge("generate", "check_hallucination")
-    workflow.add_edge("generate_direct", "check_hallucination")
+    # Direct answers have no documents to check against
+    workflow.add_edge("generate_direct", END)
     workflow.add_edge("check_hallucination", END)
     
-    return workflow.compile()
-
-def render_references(docs):
-    if docs:
-        st.markdown("### References")
-        for i, doc in enumerate(docs, start=1):
-            title = doc.metadata.get("title", "").strip()
-            url = doc.metadata.get("author", "").strip()
-            if not title and url:
-                parsed = urlparse(url)
-                title = os.path.basename(parsed.path) or "Unknown Document"
-            page = doc.metadata.get("page", "N/A")
-            with st.expander(f"{i}. {title} (Page {page})"):
-                st.markdown(f"[Link to Document]({url})\n")
-                st.markdown(doc.page_content or "No content available.")
+    return workflow.compile(checkpointer=checkpointer)
+
+# Nodes whose LLM output is the user-facing answer
+STREAMED_NODES = ("generate", "generate_direct")
+
+def stream_generation(chain, inputs, final_state, config=None):
+    """Yield answer tokens as the graph produces them.
+
+    Tokens come from the "messages" stream of the answer nodes only; grading,
+    routing and checking calls are not shown. The "values" stream keeps
+    final_state updated so the caller has the complete result once the
+    generator is exhausted.
+    """
+    for mode, chunk in chain.stream(inputs, config, stream_mode=["messages", "values"], durability="exit"):
+        if mode == "messages":
+            message, metadata = chunk
+            if metadata.get("langgraph_node") in STREAMED_NODES and isinstance(message.content, str) and message.content:
+                yield message.content
+        else:
+            final_state.clear()
+            final_state.update(chunk)
+
+def start_background_check(result, llm, on_done=None):
+    """Run the LLM hallucination check off the script thread; returns a Future of the check dict."""
+    state = {"question": result["question"], "generation": result["generation"], "documents": result["documents"], "context": result.get("context", "")}
+    future = get_background_executor().submit(lambda: check_hallucination(state, llm)["hallucination_check"])
+    if on_done is not None:
+        future.add_done_callback(lambda f: f.exception() is None and on_done(f.result()))
+    return future
+
+def render_quality_check(message):
+    """Show confidence warnings for an answer, polling while its LLM check is still running."""
+    pending = message.get("pending_check")
+    if pending is not None:
+        @st.fragment(run_every=1.0)
+        def poll_check():
+            if not pending.done():
+                st.caption("🔎 Verifying this answer against the sources...")
+                return
+            try:
+                message["quality_check"] = {**pending.result(), "method": "llm"}
+            except Exception as e:
+                logger.warning("Background hallucination check failed: %s", e)
+            message.pop("pending_check", None)
+            # Rerun the whole page so this answer renders with its final warnings
+            st.rerun()
+        poll_check()
+        return
+    
+    hallucination_check = message.get("quality_check", {})
+    # Show quality indicators if confidence is low
+    if hallucination_check.get("confidence", 1.0) < 0.6:
+        st.warning(f"⚠️ Response confidence: {hallucination_check.get('confidence', 0):.1%} - Please verify information")
+    
+    if not hallucination_check.get("is_grounded", True) and message.get("references"):
+        st.error("⚠️ This response may contain information not fully supported by the source documents")
+
+def render_references(references, key, expanded=False):
+    """One expander per turn: a memoized list of links, with chunk text loaded on request."""
+    if references:
+        with st.expander(f"References ({len(references)})", expanded=expanded):
+            st.markdown(references_markdown(references))
+            render_reference_text(references, key)
+
+@st.fragment
+def render_reference_text(references, key):
+    # Reruns only this fragment, so reading a reference doesn't redraw the conversation
+    choice = st.selectbox(
+        "Read a reference",
+        range(len(references)),
+        index=None,
+        format_func=lambda i: f"{i + 1}. {references[i].title or 'Unknown Document'} (Page {references[i].page})",
+        placeholder="Choose a reference to show its text",
+        key=f"reference_text_{key}",
+    )
+    if choice is not None:
+        st.markdown(get_chunk_cache().get(references[choice].id) or "No content available.")
+
+def render_research_notice():
+    """Dismissible banner shown until the user closes it; never blocks the script run."""
+    if st.session_state.notice_dismissed:
+        return
+    with st.container(border=True):
+        st.info(f"From Kyle: Hi {st.user.get('name')}. For research purposes, your queries may be recorded and analyzed. I appreciate your understanding as I learn to figure out how to make this application more useful. I may contact you to learn more about your use case to apply more advanced features. ", icon="🔎")
+        if st.button("Dismiss", key="dismiss_notice"):
+            st.session_state.notice_dismissed = True
+            st.rerun()
+
+def checkpoint_settings(rag_settings):
+    """(path, max idle seconds) of the shared checkpointer, or None when conversations aren't persisted."""
+    if not rag_settings.get("CHECKPOINTS_ENABLED", True):
+        return None
+    from checkpoints import DEFAULT_CHECKPOINT_PATH, DEFAULT_MAX_IDLE_SECONDS
+    return (
+        rag_settings.get("CHECKPOINT_DB_PATH", DEFAULT_CHECKPOINT_PATH),
+        float(rag_settings.get("THREAD_MAX_IDLE_DAYS", DEFAULT_MAX_IDLE_SECONDS / 86400)) * 86400,
+    )
+
+def bm25_index_settings(rag_settings):
+    """(path, built at) of the BM25 index, or None when hybrid retrieval is off or no index is built yet."""
+    if not rag_settings.get("HYBRID_RETRIEVAL_ENABLED", True):
+        return None
+    from bm25 import DEFAULT_INDEX_PATH
+    path = rag_settings.get("BM25_INDEX_PATH", DEFAULT_INDEX_PATH)
+    try:
+        # meta.json is written last, so its mtime changes with every build
+        return (path, os.stat(os.path.join(path, "meta.json")).st_mtime_ns)
+    except FileNotFoundError:
+        logger.debug("No BM25 index at %s; using vector search only", path)
+        return None
+
+def retriever_settings(rag_settings):
+    """Arguments for get_retriever: the collection version (None when the retrieval cache is off) and the BM25 index."""
+    collection_version = str(rag_settings.get("COLLECTION_VERSION", "")) if rag_settings.get("RETRIEVAL_CACHE_ENABLED", True) else None
+    return (collection_version, bm25_index_settings(rag_settings))
+
+def conversation_checkpointer(rag_settings):
+    """The shared checkpointer, or None when conversations aren't persisted."""
+    options = checkpoint_settings(rag_settings)
+    return get_checkpointer(*options) if options else None
+
+def thread_values(checkpointer, thread_id):
+    """Channel values (the conversation and its history summary) in a thread's latest checkpoint."""
+    saved = checkpointer.get_tuple({"configurable": {"thread_id": thread_id}})
+    return saved.checkpoint["channel_values"] if saved else {}
+
+def to_display_message(message, verdicts=None):
+    if message.type == "human":
+        return {"role": "user", "content": message.content}
+    display = {"role": "assistant", "content": message.content, "message_id": message.id}
+    if "references" in message.additional_kwargs:
+        display["references"] = tuple(Reference(*reference) for reference in message.additional_kwargs["references"])
+        check = (verdicts or {}).get(message.id) or message.additional_kwargs.get("quality_check", {})
+        # An interim local check whose LLM verdict never arrived says nothing reliable
+        display["quality_check"] = {} if check.get("pending") else check
+    return display
+
+def settled_checks(messages):
+    """Final LLM verdicts on this session's answers, as quality_checks entries for the thread."""
+    verdicts = []
+    for message in messages:
+        check = message.get("quality_check", {})
+        pending = message.get("pending_check")
+        if pending is not None and pending.done() and pending.exception() is None:
+            check = {**pending.result(), "method": "llm"}
+        if message.get("message_id") and check.get("method") == "llm":
+            verdicts.append({**check, "message_id": message["message_id"]})
+    return verdicts
+
+def start_thread(checkpointer, thread_id=None):
+    """Make thread_id (or a new thread) this session's conversation and put it in the URL.
+
+    A thread another user owns is never resumed; a new one is started instead.
+    """
+    owner = st.user.get("email")
+    values = {}
+    if thread_id and checkpointer is not None and checkpointer.claim(thread_id, owner):
+        values = thread_values(checkpointer, thread_id)
+    else:
+        thread_id = str(uuid.uuid4())
+        if checkpointer is not None:
+            checkpointer.claim(thread_id, owner)
+    st.session_state.thread_id = thread_id
+    # Query logs group a conversation by its thread
+    st.session_state.session_id = thread_id
+    # Prompts format history as text, so it carries no display extras
+    chat_history = values.get("messages", [])
+    st.session_state.chat_history = [
+        HumanMessage(content=message.content) if message.type == "human" else AIMessage(content=message.content)
+        for message in chat_history
+    ]
+    verdicts = {verdict["message_id"]: verdict for verdict in values.get("quality_checks", [])}
+    st.session_state.messages = [to_display_message(message, verdicts) for message in chat_history]
+    # Turns folded after the last checkpoint are folded again on the next turn
+    st.session_state.history_summary = RollingSummary(**values.get("history_summary", {}))
+
+def get_pipeline(rag_settings):
+    """Build (or fetch the cached) graph and its helpers; called on the first question."""
+    with timed("import retrieval modules"):
+        from answer_cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL_SECONDS, DEFAULT_SIMILARITY_THRESHOLD
+        from reranker import DEFAULT_THRESHOLD as DEFAULT_RERANK_THRESHOLD, DEFAULT_LEXICAL_WEIGHT
+        from tracing import DEFAULT_TRACE_PATH
+
+    gateway_options = gateway_settings(rag_settings)
+    with timed("get_chat_model"):
+        chat = get_chat_model(gateway_options)
+
+    retriever_options = retriever_settings(rag_settings)
+    with timed("get_retriever"):
+        retriever = get_retriever(*retriever_options)
+
+    # Create agentic RAG chain
+    with timed("create_agentic_rag_chain"):
+        agentic_rag_chain = create_agentic_rag_chain(
+            chat,
+            retriever,
+            grading_mode=rag_settings.get("GRADING_MODE", "concurrent"),
+            grading_concurrency=int(rag_settings.get("GRADING_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            grading_timeout=float(rag_settings.get("GRADING_TIMEOUT_SECONDS", DEFAULT_TIMEOUT)),
+            diversity_method=rag_settings.get("DIVERSITY_METHOD", "jaccard"),
+            budget=RequestBudget(
+                max_rewrites=int(rag_settings.get("MAX_REWRITES", DEFAULT_MAX_REWRITES)),
+                deadline_seconds=float(rag_settings.get("DEADLINE_SECONDS", DEFAULT_DEADLINE_SECONDS)),
+                max_llm_calls=int(rag_settings.get("MAX_LLM_CALLS", DEFAULT_MAX_LLM_CALLS)),
+            ),
+            prerouter_enabled=bool(rag_settings.get("PREROUTER_ENABLED", True)),
+            prerouter_canned_replies=bool(rag_settings.get("PREROUTER_CANNED_REPLIES", True)),
+            hallucination_mode=rag_settings.get("HALLUCINATION_CHECK_MODE", "tiered"),
+            context_max_tokens=int(rag_settings.get("CONTEXT_MAX_TOKENS", DEFAULT_CONTEXT_TOKENS)),
+            speculative_mode=rag_settings.get("SPECULATIVE_RETRIEVAL", "retrieve"),
+            max_speculations=int(rag_settings.get("SPECULATION_MAX_CONCURRENCY", DEFAULT_MAX_SPECULATIONS)),
+            topology=rag_settings.get("GRAPH_TOPOLOGY", "router"),
+            _speculation_stats=get_speculation_stats(),
+            rerank_options=(
+                float(rag_settings.get("LOCAL_RERANK_THRESHOLD", DEFAULT_RERANK_THRESHOLD)),
+                float(rag_settings.get("LOCAL_RERANK_LEXICAL_WEIGHT", DEFAULT_LEXICAL_WEIGHT)),
+            ),
+            trace_path=rag_settings.get("TRACE_DB_PATH", DEFAULT_TRACE_PATH) if rag_settings.get("TRACING_ENABLED", True) else None,
+            checkpoint_options=checkpoint_settings(rag_settings),
+            # The model and retriever aren't hashed; their settings rebuild the graph when they change
+            retriever_options=retriever_options,
+            gateway_options=gateway_options,
+        )
+
+    # Shared across sessions; answers repeat questions without running the graph
+    answer_cache = None
+    if rag_settings.get("ANSWER_CACHE_ENABLED", True):
+        answer_cache = get_answer_cache(
+            max_entries=int(rag_settings.get("ANSWER_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            ttl_seconds=float(rag_settings.get("ANSWER_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            similarity_threshold=float(rag_settings.get("ANSWER_CACHE_SIMILARITY", DEFAULT_SIMILARITY_THRESHOLD)),
+            gateway_options=gateway_options,
+        )
+
+    with timed("get_query_writer"):
+        query_tracker = get_query_writer()
+
+    return agentic_rag_chain, answer_cache, query_tracker, chat
 
 def render_chat_page():
 
     # Set session states
     st.session_state.current_page = "chat"
-    st.session_state.session_id = str(uuid.uuid4())
     menu()
     st.title("ClerkGPT Chat")
     st.markdown("Welcome to ClerkGPT! Ask your questions below.")
+    render_research_notice()
 
-    vector_store = get_vector_store()
-    retriever = vector_store.as_retriever(
-        search_type="similarity_score_threshold",
-        search_kwargs={"score_threshold": 0.4, "k": 15}
-    )
-
-    query_tracker = get_query_store()
+    # Optional tuning knobs live under [rag] in secrets.toml
+    rag_settings = st.secrets.get("rag", {})
+    stream_responses = bool(rag_settings.get("STREAM_RESPONSES", True))
 
-    chat = ChatOpenAI(
-        temperature=0,
-        openai_api_key=st.secrets['openai']["OPENAI_API_KEY"],
-        model=st.secrets["openai"]["OPENAI_MODEL"],
-    )
+    # The pipeline is built on the first question; get its imports going meanwhile
+    warm_imports()
 
-    # Create agentic RAG chain
-    agentic_rag_chain = create_agentic_rag_chain(chat, retriever)
-
-    # Helper function to convert messages to chat history format
-    def get_chat_history():
-        """Convert session messages to chat history format for the new chain."""
-        chat_history = []
-        for message in st.session_state.messages:
-            if message["role"] == "user":
-                chat_history.append(HumanMessage(content=message["content"]))
-            elif message["role"] == "assistant":
-                chat_history.append(AIMessage(content=message["content"]))
-        return chat_history
+    # One LangGraph thread per conversation; its id in the URL resumes it after a reload or restart
+    checkpointer = conversation_checkpointer(rag_settings)
+    if "thread_id" not in st.session_state:
+        start_thread(checkpointer, st.query_params.get("thread"))
+    if st.query_params.get("thread") != st.session_state.thread_id:
+        st.query_params["thread"] = st.session_state.thread_id
+    thread_config = {"configurable": {"thread_id": st.session_state.thread_id}}
 
     # Display chat history
-    for message in st.session_state.messages:
+    for turn, message in enumerate(st.session_state.messages):
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
-            if message["role"] == "assistant" and "results" in message:
-                render_references(message["results"])
+            if message["role"] == "assistant" and "references" in message:
+                render_quality_check(message)
+                render_references(message["references"], key=turn)
 
     # User input and response
     if prompt := st.chat_input("Ask me anything!"):
@@ -461,73 +1169,176 @@ def render_chat_page():
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Get chat history for the chain
-        chat_history = get_chat_history()
+        # The conversation so far plus this question; kept per session, never rebuilt
+        question_message = HumanMessage(content=prompt)
+        chat_history = st.session_state.chat_history + [question_message]
         
         # Generate response
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
                 try:
-                    # Invoke the agentic RAG chain
-                    result = agentic_rag_chain.invoke({
+                    agentic_rag_chain, answer_cache, query_tracker, chat = get_pipeline(rag_settings)
+                    
+                    # Older turns reach the prompts as a rolling summary, within a token budget
+                    history_manager = ChatHistoryManager(
+                        summarize=lambda previous, new: summarize_history(chat, previous, new),
+                        keep_turns=int(rag_settings.get("HISTORY_KEEP_TURNS", DEFAULT_KEEP_TURNS)),
+                        max_tokens=int(rag_settings.get("HISTORY_MAX_TOKENS", DEFAULT_HISTORY_TOKENS)),
+                    )
+                    history_summary = st.session_state.history_summary
+                    prompt_history, history_stats = history_manager.compact(chat_history, history_summary)
+                    logger.info("Chat history: %s", history_stats)
+                    
+                    # Per-request channels are all reset: with a checkpointer they would otherwise carry over from the last turn
+                    inputs = {
+                        "messages": [question_message],
                         "question": prompt,
-                        "chat_history": chat_history,
+                        "chat_history": prompt_history,
                         "documents": [],
                         "generation": "",
                         "routing": {},
-                        "hallucination_check": {}
-                    })
+                        "hallucination_check": {},
+                        "metrics": {"history": history_stats},
+                        "budget": {},
+                        "embeddings": [],
+                        "context": "",
+                        "speculative": {},
+                        "plan": {},
+                        "request_id": str(uuid.uuid4())
+                    }
+                    
+                    # Follow-ups depend on the conversation, so they never use the shared cache
+                    cached, cache_probe = None, None
+                    if answer_cache is not None:
+                        from answer_cache import is_follow_up
+                        if is_follow_up(prompt, chat_history):
+                            answer_cache.record_bypass()
+                        else:
+                            cached, cache_probe = answer_cache.lookup(prompt)
+                    
+                    streamed = ""
+                    if cached is not None:
+                        result = cached
+                        logger.info("Answer cache hit: %s", answer_cache.stats())
+                    elif stream_responses:
+                        # Show answer tokens as they arrive; the rest renders once the graph finishes
+                        result = {}
+                        streamed = st.write_stream(stream_generation(agentic_rag_chain, inputs, result, thread_config))
+                    else:
+                        # Invoke the agentic RAG chain
+                        result = agentic_rag_chain.invoke(inputs, thread_config, durability="exit")
+                    
+                    # Only answers that passed the quality check are worth reusing
+                    def passes(check):
+                        return check.get("is_grounded", True) and check.get("confidence", 1.0) >= 0.6
+                    
+                    def cache_if_passes(check):
+                        if cache_probe is not None and cached is None and passes(check):
+                            answer_cache.store(cache_probe, {**result, "hallucination_check": check})
+                    
+                    answer_id = str(uuid.uuid4())
+                    
+                    def save_verdict(check):
+                        # The thread has the interim local check; a resumed session should show this one
+                        try:
+                            with get_thread_update_lock():
+                                agentic_rag_chain.update_state(
+                                    thread_config,
+                                    {"quality_checks": [{**check, "method": "llm", "message_id": answer_id}]},
+                                    as_node="generate_direct",
+                                )
+                        except Exception as e:
+                            logger.warning("Could not save the hallucination check to the thread: %s", e)
+                    
+                    def finish_check(check):
+                        cache_if_passes(check)
+                        if checkpointer is not None:
+                            save_verdict(check)
                     
                     # Extract answer and source documents
                     answer = result["generation"]
                     source_docs = result.get("documents", [])
+                    # Turns keep compact references; chunk text goes to the shared bounded cache
+                    references = get_chunk_cache().add_documents(source_docs)
                     hallucination_check = result.get("hallucination_check", {})
                     
-                    # Display the answer
-                    st.markdown(answer)
-                    
-                    # Show quality indicators if confidence is low
-                    if hallucination_check.get("confidence", 1.0) < 0.6:
-                        st.warning(f"⚠️ Response confidence: {hallucination_check.get('confidence', 0):.1%} - Please verify information")
-                    
-                    if not hallucination_check.get("is_grounded", True) and source_docs:
-                        st.error("⚠️ This response may contain information not fully supported by the source documents")
+                    # Display the answer (already on screen when it was streamed)
+                    if not streamed:
+                        st.markdown(answer)
                     
                     # Add assistant message to chat history
                     message_data = {
                         "role": "assistant", 
                         "content": answer,
-                        "results": source_docs,
+                        "references": references,
                         "quality_check": hallucination_check
                     }
+                    if checkpointer is not None:
+                        message_data["message_id"] = answer_id
                     st.session_state.messages.append(message_data)
                     
+                    st.session_state.chat_history = chat_history + [AIMessage(content=answer)]
+                    if checkpointer is not None:
+                        # The thread's copy keeps what a resumed session needs to redraw the answer
+                        answer_message = AIMessage(id=answer_id, content=answer, additional_kwargs={
+                            "references": [list(reference) for reference in references],
+                            "quality_check": hallucination_check,
+                        })
+                        # A cached answer never ran the graph, so the question goes in too
+                        new_messages = [answer_message] if cached is None else [question_message, answer_message]
+                        with get_thread_update_lock():
+                            agentic_rag_chain.update_state(
+                                thread_config,
+                                # Verdicts saved while this turn's graph ran were overwritten by it, so they go in again
+                                {"messages": new_messages, "history_summary": history_summary.snapshot(), "quality_checks": settled_checks(st.session_state.messages)},
+                                as_node="generate_direct",
+                            )
+                        get_background_executor().submit(checkpointer.maintain, st.session_state.thread_id)
+                    
+                    # Ambiguous local grounding scores get the LLM check after the answer is shown and saved
+                    if hallucination_check.get("pending"):
+                        message_data["pending_check"] = start_background_check(result, chat, on_done=finish_check)
+                    else:
+                        cache_if_passes(hallucination_check)
+                    
+                    # Fold turns that just left the verbatim window into the summary, off the request thread
+                    get_background_executor().submit(history_manager.refresh_summary, st.session_state.chat_history, history_summary)
+                    
+                    # Show quality indicators (or poll for them while the LLM check runs)
+                    render_quality_check(message_data)
+                    
                     # Display references if available
                     if source_docs:
-                        render_references(source_docs)
+                        render_references(references, key=len(st.session_state.messages) - 1, expanded=True)
                         st.caption(f"📊 Showing {len(source_docs)} most relevant and diverse documents")
                         
-                    # Track query - Fixed method call
+                    # Track query - queued and written in batches off the request thread
                     if query_tracker:
-                        try:
-                            # Insert the query record into the database
-                            query_data = {
-                                "query_id":str(uuid.uuid4()),
-                                "session": st.session_state.session_id,
-                                "user": st.user.get('email'),
-                                "query": prompt,
-                                "timestamp": datetime.now().isoformat(),
-                            }
-                            query_tracker.insert_one(query_data)
-                        except Exception as query_error:
-                            st.warning(f"Failed to track query: {str(query_error)}")
+                        query_data = {
+                            "query_id":str(uuid.uuid4()),
+                            "session": st.session_state.session_id,
+                            "user": st.user.get('email'),
+                            "query": prompt,
+                            "timestamp": datetime.now().isoformat(),
+                        }
+                        query_tracker.submit(query_data)
                         
                 except Exception as e:
+                    from llm_gateway import is_rate_limit_error
+                    if is_rate_limit_error(e):
+                        # Queued past the gateway's wait limit, or the provider refused
+                        busy = "ClerkGPT is answering a lot of questions right now. Please try again in a minute."
+                        st.warning(busy)
+                        st.session_state.messages.append({"role": "assistant", "content": busy})
+                        return
                     st.error(f"An error occurred: {str(e)}")
                     st.session_state.messages.append({
                         "role": "assistant", 
                         "content": f"I apologize, but I encountered an error: {str(e)}"
                     })
 
-if 'authenticated' in st.session_state and st.session_state['authenticated']:
-    render_chat_page()
\ No newline at end of file
+# Checked on every run, not just at login, so revoked users lose access within the cache TTL
+if is_authorized_user():
+    render_chat_page()
+elif getattr(st.user, "is_logged_in", False):
+    st.error("You are not authorized to use this app.")
\ No newline at end of file
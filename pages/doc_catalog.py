@@ -1,16 +1,54 @@
+import math
+
 import streamlit as st
-import pandas as pd
 from menu import menu
+from catalog import load_catalog_index, catalog_mtime, CATALOG_PATH
+
+PAGE_SIZES = (25, 50, 100)
 
-@st.cache_resource(show_spinner=False)
-def get_doc_catalog():
-    data_catalog = pd.read_csv("notebooks/files/pdf_metadata.csv")
-    return data_catalog[['filename','title', 'pdf_url', 'source_url', 'creationDate']]
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_doc_catalog(mtime_ns):
+    # mtime_ns is only the cache key: a new CSV loads (and re-caches) a new catalog
+    return load_catalog_index(CATALOG_PATH)
 
 def render_doc_catalog():
     st.title("Document Catalog")
     menu()
-    st.write("This page will display the catalog of documents available in the system.")
-    st.dataframe(get_doc_catalog())
+    catalog = get_doc_catalog(catalog_mtime(CATALOG_PATH))
+
+    query = st.text_input("Search", placeholder="Search titles, filenames and source pages")
+    lowest, highest = catalog.date_bounds()
+    created_from = created_to = None
+    if lowest is not None:
+        date_range = st.date_input(
+            "Created between",
+            value=(lowest.date(), highest.date()),
+            min_value=lowest.date(),
+            max_value=highest.date(),
+        )
+        # Documents without a creation date only show while the full range is selected
+        if len(date_range) == 2 and tuple(date_range) != (lowest.date(), highest.date()):
+            created_from, created_to = date_range
+
+    rows = catalog.search(query, created_from, created_to)
+    c1, c2 = st.columns([3, 1])
+    with c2:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES)
+    pages = max(1, math.ceil(len(rows) / page_size))
+    with c1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1)
+    st.caption(f"{len(rows)} of {len(catalog.frame)} documents")
+
+    # Only the current page is sent to the browser
+    st.dataframe(
+        catalog.page(rows, page, page_size)[["title", "filename", "pdf_url", "source_url", "created"]],
+        column_config={
+            "pdf_url": st.column_config.LinkColumn("PDF"),
+            "source_url": st.column_config.LinkColumn("Source"),
+            "created": st.column_config.DateColumn("Created"),
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
 
-render_doc_catalog()
\ No newline at end of file
+render_doc_catalog()
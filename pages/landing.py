@@ -1,5 +1,5 @@
 import streamlit as st
-from astrapy import DataAPIClient
+from auth import is_authorized_user
 
 WELCOME_MESSAGE: str = "Welcome to ClerkGPT!"
 
@@ -22,17 +22,9 @@ def render_landing_page():
         login_screen()
         st.stop()
     else:
-        user_email = getattr(st.user, "email", None)
-        client = DataAPIClient(st.secrets['astra']['ASTRA_COLLECTION_USERNAME_TOKEN'])
-        db = client.get_database_by_api_endpoint(st.secrets['astra']['ASTRA_DB_API_ENDPOINT'])
-        table = db.get_table(st.secrets['astra']['ASTRA_COLLECTION_USERNAME_DB'])
-        result = table.find_one({'users': user_email})
-        # Perform a query to check if the user is in the database
-
-        if result:
-            st.session_state["authenticated"] = True
+        # Check whether the user is in the allowlist table
+        if is_authorized_user():
             st.switch_page("pages/chat.py")
         else:
-            st.session_state["authenticated"] = False
             st.error("You are not authorized to use this app.")
 render_landing_page()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import time
+
+import streamlit as st
+from menu import menu, is_admin
+from resources import get_prerouter, get_trace_sink
+from startup import startup_report
+from tracing import DEFAULT_TRACE_PATH
+
+WINDOWS = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400, "All time": None}
+
+if "current_page" not in st.session_state:
+    st.session_state.current_page = "metrics"
+
+def render_prerouter_stats(stats) -> None:
+    st.subheader("Pre-router (this process)")
+    if not stats["total"]:
+        st.info("No questions have reached the pre-router yet.")
+        return
+    st.metric("Answered without the LLM router", f"{stats['fast_path_fraction']:.1%}", help=f"{stats['fast_path']} of {stats['total']} questions")
+    if stats["by_tier_and_intent"]:
+        rows = [(*key.split(":", 1), count) for key, count in sorted(stats["by_tier_and_intent"].items())]
+        st.dataframe({"tier": [tier for tier, _, _ in rows], "intent": [intent for _, intent, _ in rows], "questions": [count for _, _, count in rows]})
+
+def render_metrics_page() -> None:
+    st.session_state.current_page = "metrics"
+    menu()
+    st.title("Pipeline Metrics")
+    if not is_admin():
+        st.error("This page is only available to administrators.")
+        return
+
+    settings = st.secrets.get("rag", {})
+    sink = get_trace_sink(settings.get("TRACE_DB_PATH", DEFAULT_TRACE_PATH))
+    window = st.selectbox("Window", list(WINDOWS), index=1)
+    since = time.time() - WINDOWS[window] if WINDOWS[window] else 0.0
+
+    spans = sink.spans(since)
+    if spans.empty:
+        st.info("No traced requests in this window yet.")
+    else:
+        st.metric("Requests", spans["request_id"].nunique())
+        st.subheader("Per node")
+        st.dataframe(sink.node_summary(since).round(1))
+        st.subheader("Per request")
+        # Spans overlap (speculative grading runs alongside route), so a request lasts from its first start to its last end
+        requests = spans.assign(ended_at=spans["started_at"] + spans["wall_ms"] / 1000).groupby("request_id").agg(
+            started_at=("started_at", "min"),
+            ended_at=("ended_at", "max"),
+            nodes=("node", "count"),
+            llm_calls=("llm_calls", "sum"),
+            prompt_tokens=("prompt_tokens", "sum"),
+            completion_tokens=("completion_tokens", "sum"),
+        )
+        requests.insert(2, "wall_ms", (requests.pop("ended_at") - requests["started_at"]) * 1000)
+        st.caption(
+            "Total request time p50 / p95 / p99: "
+            + " / ".join(f"{requests['wall_ms'].quantile(q):.0f} ms" for q in (0.5, 0.95, 0.99))
+        )
+        st.dataframe(requests.sort_values("started_at", ascending=False).round(1))
+
+    if settings.get("PREROUTER_ENABLED", True):
+        render_prerouter_stats(get_prerouter(bool(settings.get("PREROUTER_CANNED_REPLIES", True))).stats())
+
+    report = startup_report()
+    if report:
+        st.subheader("Startup (this process)")
+        st.dataframe({"step": list(report), "seconds": [round(s, 2) for s in report.values()]})
+
+if 'authenticated' in st.session_state and st.session_state['authenticated']:
+    render_metrics_page()
@@ -0,0 +1,116 @@
+import re
+import threading
+from collections import Counter
+
+# Tier 1: whole-message patterns for the obvious cases
+_PATTERNS = {
+    "greeting": re.compile(
+        r"^(hi+|hello+|hey+|howdy|greetings|yo|hiya|good (morning|afternoon|evening|day)|"
+        r"what'?s up|sup|how are you( doing)?( today)?|how'?s it going)"
+        r"( there| all| everyone| clerk ?gpt| friend)?$"
+    ),
+    "thanks": re.compile(
+        r"^(thanks+|thank you|thx|ty|many thanks|much appreciated|appreciate it|"
+        r"(ok|okay|great|perfect|awesome|cool),? thanks)( so much| very much| a lot| again)?"
+        r"( clerk ?gpt)?$"
+    ),
+    "goodbye": re.compile(r"^(bye|goodbye|good bye|see (you|ya)( later)?|later|farewell|have a (good|great|nice) (day|night))$"),
+    "meta": re.compile(
+        r"^(who are you|what are you|what is clerk ?gpt|what'?s clerk ?gpt|what can you do|"
+        r"what do you do|how do you work|how does (this|clerk ?gpt) work|help|"
+        r"what can i ask( you)?|what documents do you (have|use|know about))$"
+    ),
+}
+
+# Tier 2: a tiny bag-of-words scorer for short social messages the patterns miss
+# Ties go to the first intent listed ("hey, thanks!" is thanks)
+_SOCIAL_WORDS = {
+    "thanks": {"thanks", "thank", "thx", "appreciate", "appreciated", "grateful", "helpful"},
+    "greeting": {"hi", "hello", "hey", "morning", "afternoon", "evening", "greetings", "howdy"},
+    "goodbye": {"bye", "goodbye", "later", "farewell"},
+}
+_FILLER_WORDS = {
+    "you", "so", "much", "very", "a", "lot", "good", "great", "ok", "okay", "and",
+    "that", "was", "this", "is", "really", "again", "all", "there", "for", "the",
+    "help", "your", "clerkgpt", "oh", "well", "have", "nice", "day", "see",
+}
+# Anything that looks like a real question keeps the LLM router in the loop
+_DOMAIN_WORDS = {
+    "bco", "sjc", "pca", "ga", "presbytery", "presbyteries", "session", "assembly",
+    "overture", "overtures", "elder", "elders", "deacon", "deacons", "pastor",
+    "minister", "church", "churches", "confession", "westminster", "catechism",
+    "ordination", "complaint", "appeal", "case", "minutes", "report", "rules",
+    "order", "book", "judicial", "commission", "discipline", "baptism", "membership",
+}
+_MAX_CLASSIFIER_WORDS = 8
+
+CANNED_REPLIES = {
+    "greeting": "Hello! I'm ClerkGPT. I can help with PCA questions about church governance, the Book of Church Order, General Assembly matters, Standing Judicial Commission cases, or theology. What would you like to know?",
+    "thanks": "You're welcome! Let me know if you have any other PCA questions.",
+    "goodbye": "Goodbye! Come back anytime you have questions about the PCA.",
+    "meta": "I'm ClerkGPT, a research assistant for the Presbyterian Church in America. I answer questions by searching PCA documents such as the Book of Church Order, General Assembly minutes and overtures, and Standing Judicial Commission decisions, and I list the references I used. Ask a specific question to get started.",
+}
+
+# The LLM router's query types for each local intent
+QUERY_TYPES = {"greeting": "greeting", "thanks": "greeting", "goodbye": "greeting", "meta": "meta"}
+
+def _normalize(question: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", question.lower()).split())
+
+def classify(question: str):
+    """Return (intent, tier) for an obvious social or meta message, else None."""
+    text = _normalize(question)
+    if not text:
+        return None
+    for intent, pattern in _PATTERNS.items():
+        if pattern.match(text):
+            return intent, "pattern"
+
+    words = text.split()
+    if len(words) > _MAX_CLASSIFIER_WORDS or "?" in question or any(word in _DOMAIN_WORDS for word in words):
+        return None
+    scores = {intent: sum(word in vocab for word in words) for intent, vocab in _SOCIAL_WORDS.items()}
+    intent = max(scores, key=scores.get)
+    explained = sum(word in _FILLER_WORDS or any(word in vocab for vocab in _SOCIAL_WORDS.values()) for word in words)
+    if scores[intent] and explained == len(words):
+        return intent, "classifier"
+    return None
+
+class PreRouter:
+    """Local routing tier that runs before the LLM router and counts what it catches."""
+
+    def __init__(self, canned_replies=True):
+        self.canned_replies = canned_replies
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def route(self, question: str):
+        """Return a routing dict for fast-path queries, or None to fall through to the LLM router."""
+        match = classify(question)
+        with self._lock:
+            self._counts["total"] += 1
+            if match is not None:
+                self._counts[f"{match[1]}:{match[0]}"] += 1
+                self._counts["fast_path"] += 1
+        if match is None:
+            return None
+        intent, tier = match
+        return {
+            "needs_retrieval": False,
+            "query_type": QUERY_TYPES[intent],
+            "reasoning": f"Matched '{intent}' locally ({tier})",
+            "intent": intent,
+            "source": "prerouter",
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        total = counts.pop("total", 0)
+        fast_path = counts.pop("fast_path", 0)
+        return {
+            "total": total,
+            "fast_path": fast_path,
+            "fast_path_fraction": fast_path / total if total else 0.0,
+            "by_tier_and_intent": counts,
+        }
@@ -0,0 +1,167 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_MAX_QUEUE = 1000
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 0.5
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+class QueryLogWriter:
+    """Writes query records to an Astra table from a background thread.
+
+    submit() never blocks the request thread. Records are sent with
+    insert_many once batch_size have queued up or flush_interval seconds
+    after the first record of a batch arrived. Failed batches are retried
+    with exponential backoff; batches that still fail, and records that
+    arrive while the queue is full, are appended to spill_path as JSON lines
+    (or dropped when no spill file is configured). Pending records are
+    flushed at interpreter exit.
+    """
+
+    def __init__(self, table, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL, max_queue=DEFAULT_MAX_QUEUE,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_seconds=DEFAULT_BACKOFF_SECONDS, spill_path=None):
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.spill_path = spill_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        # Request threads and the writer thread both count
+        self._counts_lock = threading.Lock()
+        self.counts = Counter()
+        self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, record: dict) -> bool:
+        """Queue a record for writing. Returns False if it had to be spilled or dropped."""
+        if self._closed:
+            self._spill([record])
+            return False
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            logger.warning("Query log queue is full")
+            self._spill([record])
+            return False
+        self._count("submitted")
+        return True
+
+    def flush(self, timeout=None) -> bool:
+        """Write everything queued so far. Returns False if the timeout ran out first."""
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def close(self, timeout=10.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self.flush(timeout)
+
+    def stats(self) -> dict:
+        with self._counts_lock:
+            counts = dict(self.counts)
+        return {"queued": self._queue.qsize(), **counts}
+
+    def _count(self, name, n=1):
+        with self._counts_lock:
+            self.counts[name] += n
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            wait = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, _Flush):
+                self._write(batch)
+                batch, deadline = [], None
+                item.done.set()
+                continue
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch, deadline = [], None
+
+    def _write(self, batch):
+        if not batch:
+            return
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.table.insert_many(batch)
+                self._count("written", len(batch))
+                self._count("batches")
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.warning("Giving up on %d query records after %d attempts: %s", len(batch), attempt + 1, e)
+                    break
+                self._count("retries")
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+        self._count("failed_batches")
+        self._spill(batch)
+
+    def _spill(self, records):
+        if not self.spill_path:
+            self._count("dropped", len(records))
+            return
+        try:
+            with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + "\n")
+            self._count("spilled", len(records))
+        except OSError as e:
+            logger.warning("Could not spill %d query records: %s", len(records), e)
+            self._count("dropped", len(records))
+
+class InMemoryTable:
+    """Local stand-in for the Astra query table, for development and tests.
+
+    fail_next makes that many upcoming insert calls raise, and latency adds a
+    sleep to every call.
+    """
+
+    def __init__(self, fail_next=0, latency=0.0):
+        self.rows = []
+        self.calls = 0
+        self.fail_next = fail_next
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def insert_many(self, rows):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.fail_next:
+                self.fail_next -= 1
+                raise ConnectionError("Simulated insert failure")
+            self.rows.extend(dict(row) for row in rows)
+
+    def insert_one(self, row):
+        self.insert_many([row])
@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CHARS = 20_000_000
+_LOCAL_PREFIX = "local:"
+
+class Reference(NamedTuple):
+    """What a chat turn keeps about a source document; the chunk text lives in ChunkTextCache."""
+    id: str
+    title: str
+    url: str
+    page: str
+
+def reference_id(doc):
+    if doc.id:
+        return doc.id
+    # Chunks without a store id can't be fetched again, only found in the cache
+    digest = hashlib.sha1(f"{doc.metadata.get('author', '')}\0{doc.metadata.get('page')}\0{doc.page_content}".encode()).hexdigest()
+    return _LOCAL_PREFIX + digest
+
+def to_reference(doc) -> Reference:
+    title = doc.metadata.get("title", "").strip()
+    url = doc.metadata.get("author", "").strip()
+    if not title and url:
+        parsed = urlparse(url)
+        title = os.path.basename(parsed.path) or "Unknown Document"
+    return Reference(reference_id(doc), title, url, str(doc.metadata.get("page", "N/A")))
+
+@lru_cache(maxsize=512)
+def references_markdown(references: tuple) -> str:
+    """Markdown list of references, built once per distinct tuple of references."""
+    lines = []
+    for i, ref in enumerate(references, start=1):
+        title = ref.title or "Unknown Document"
+        lines.append(f"{i}. [{title}]({ref.url}) (Page {ref.page})" if ref.url else f"{i}. {title} (Page {ref.page})")
+    return "\n".join(lines)
+
+class ChunkTextCache:
+    """Shared, size-bounded LRU of chunk text keyed by reference id.
+
+    Evicted text is fetched again through `fetch` (for example from the
+    vector store by document id) when it is next asked for.
+    """
+
+    def __init__(self, fetch=None, max_chars=DEFAULT_MAX_CHARS):
+        self.fetch = fetch
+        self.max_chars = max_chars
+        self._texts = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, key, text) -> None:
+        with self._lock:
+            previous = self._texts.pop(key, None)
+            if previous is not None:
+                self._chars -= len(previous)
+            self._texts[key] = text
+            self._chars += len(text)
+            while self._chars > self.max_chars and len(self._texts) > 1:
+                _, evicted = self._texts.popitem(last=False)
+                self._chars -= len(evicted)
+
+    def add_documents(self, documents) -> tuple:
+        """Cache each document's text and return compact references to them."""
+        references = []
+        for doc in documents:
+            reference = to_reference(doc)
+            self.put(reference.id, doc.page_content or "")
+            references.append(reference)
+        return tuple(references)
+
+    def get(self, key):
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+                self.hits += 1
+                return text
+            self.misses += 1
+        if self.fetch is None or key.startswith(_LOCAL_PREFIX):
+            return None
+        try:
+            text = self.fetch(key)
+        except Exception as e:
+            logger.warning("Could not fetch chunk %s: %s", key, e)
+            return None
+        if text is not None:
+            self.put(key, text)
+        return text
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._texts), "chars": self._chars, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,95 @@
+"""Local, CPU-only relevance grading of retrieved chunks.
+
+GRADING_MODE = "local" grades documents with this instead of one LLM call
+per chunk. Each document gets two scores against the question, vectorized
+over all candidates with NumPy:
+
+- lexical: the share of question terms (weighted, citations like "13-6"
+  count double) the chunk contains, using the BM25 tokenizer,
+- n-gram: the share of the question's hashed character trigrams found in
+  the chunk, which tolerates plurals and other word-form changes.
+
+Their weighted sum is the relevance score; grades have the score,
+relevance_score and reasoning fields the LLM grader returns.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from bm25 import tokenize
+
+DEFAULT_THRESHOLD = 0.6
+DEFAULT_LEXICAL_WEIGHT = 0.5
+DEFAULT_DIMENSIONS = 1 << 16
+_CITATION_WEIGHT = 2.0
+_NON_ALNUM = bytes.maketrans(
+    bytes(range(256)),
+    bytes(c if chr(c).isascii() and chr(c).isalnum() else 32 for c in range(256)),
+)
+
+class LocalGrade(NamedTuple):
+    score: str
+    relevance_score: float
+    reasoning: str
+
+def _stem(token):
+    # Enough to match "elders" with "elder"; citations and short words stay as they are
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+def _terms(text):
+    return [_stem(token) for token in tokenize(text)]
+
+def _trigram_hashes(text, dimensions):
+    # Words separated by single spaces, padded so word starts and ends form their own trigrams
+    normalized = b" " + b" ".join(text.lower().encode("ascii", "ignore").translate(_NON_ALNUM).split()) + b" "
+    if len(normalized) < 3:
+        return np.empty(0, dtype=np.int64)
+    data = np.frombuffer(normalized, dtype=np.uint8).astype(np.int64)
+    return np.unique((data[:-2] * 65599 * 65599 + data[1:-1] * 65599 + data[2:]) % dimensions)
+
+class LocalReranker:
+    """Scores documents against a question without network access; safe to share between threads."""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, lexical_weight=DEFAULT_LEXICAL_WEIGHT, dimensions=DEFAULT_DIMENSIONS):
+        self.threshold = threshold
+        self.lexical_weight = lexical_weight
+        self.dimensions = dimensions
+
+    def scores(self, question, texts):
+        """Lexical and n-gram scores in [0, 1] for each text, plus the question terms each one matched."""
+        query_terms = list(dict.fromkeys(_terms(question)))
+        if not texts:
+            return np.zeros(0), np.zeros(0), []
+
+        weights = np.array([_CITATION_WEIGHT if any(c.isdigit() for c in term) else 1.0 for term in query_terms])
+        doc_terms = [set(_terms(text)) for text in texts]
+        present = np.array([[term in terms for term in query_terms] for terms in doc_terms], dtype=float).reshape(len(texts), len(query_terms))
+        lexical = present @ weights / weights.sum() if len(query_terms) else np.zeros(len(texts))
+
+        query_grams = _trigram_hashes(question, self.dimensions)
+        if len(query_grams):
+            lookup = np.full(self.dimensions, -1, dtype=np.int64)
+            lookup[query_grams] = np.arange(len(query_grams))
+            found = np.zeros((len(texts), len(query_grams)), dtype=bool)
+            for row, text in enumerate(texts):
+                columns = lookup[_trigram_hashes(text, self.dimensions)]
+                found[row, columns[columns >= 0]] = True
+            ngram = found.mean(axis=1)
+        else:
+            ngram = np.zeros(len(texts))
+
+        matched = [[term for term, hit in zip(query_terms, row) if hit] for row in present.astype(bool)]
+        return lexical, ngram, matched
+
+    def grade(self, question, documents):
+        """One LocalGrade per document, aligned with documents."""
+        lexical, ngram, matched = self.scores(question, [doc.page_content for doc in documents])
+        relevance = self.lexical_weight * lexical + (1 - self.lexical_weight) * ngram
+        return [
+            LocalGrade(
+                "yes" if score >= self.threshold else "no",
+                round(float(score), 3),
+                f"Local reranker: matched {', '.join(terms[:6]) or 'no question terms'} (lexical {lex:.2f}, n-gram {gram:.2f})",
+            )
+            for score, lex, gram, terms in zip(relevance, lexical, ngram, matched)
+        ]
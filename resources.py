@@ -0,0 +1,13 @@
+import streamlit as st
+
+# Process-wide resources read by more than one page; defined here so every page gets the same cached instance
+
+@st.cache_resource(show_spinner=False)
+def get_prerouter(canned_replies=True):
+    from prerouter import PreRouter
+    return PreRouter(canned_replies=canned_replies)
+
+@st.cache_resource(show_spinner=False)
+def get_trace_sink(path):
+    from tracing import TraceSink
+    return TraceSink(path)
@@ -0,0 +1,134 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from langchain_core.documents import Document
+
+from answer_cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_CHARS = 50_000_000
+DEFAULT_TTL_SECONDS = 6 * 3600.0
+
+class CachedHit(NamedTuple):
+    id: Optional[str]
+    page_content: str
+    metadata: dict
+    score: Optional[float]
+
+class _Entry(NamedTuple):
+    hits: tuple
+    chars: int
+    created_at: float
+
+class RetrievalCache:
+    """Bounded, TTL'd store of vector search results shared across sessions.
+
+    Entries hold only the document payloads and scores. Memory is bounded by
+    both the number of entries and the total characters of page content,
+    evicting least recently used entries first. Changing the collection
+    version (or calling invalidate) drops everything, for re-ingestion.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_chars=DEFAULT_MAX_CHARS, ttl_seconds=DEFAULT_TTL_SECONDS, version=""):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.ttl_seconds = ttl_seconds
+        self.version = version
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(query: str, search_kwargs: dict) -> str:
+        return normalize_question(query) + "|" + json.dumps(search_kwargs, sort_keys=True, default=str)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created_at > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.hits
+
+    def put(self, key, hits) -> None:
+        hits = tuple(hits)
+        chars = sum(len(hit.page_content) for hit in hits)
+        if chars > self.max_chars:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(hits, chars, time.monotonic())
+            self._chars += chars
+            while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+                self._remove(next(iter(self._entries)))
+
+    def ensure_version(self, version: str) -> None:
+        """Invalidate when the collection has been re-ingested under a new version."""
+        if version != self.version:
+            self.invalidate()
+            self.version = version
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+            self.invalidations += 1
+        logger.info("Retrieval cache invalidated")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "chars": self._chars,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "round_trips_saved": self.hits,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key) -> None:
+        entry = self._entries.pop(key)
+        self._chars -= entry.chars
+
+class CachedRetriever:
+    """Drop-in for a VectorStoreRetriever that answers repeat queries from a RetrievalCache."""
+
+    def __init__(self, retriever, cache: RetrievalCache):
+        self.retriever = retriever
+        self.cache = cache
+        # Callers that need raw vectors (MMR) go straight to the store
+        self.vectorstore = getattr(retriever, "vectorstore", None)
+        self.search_kwargs = getattr(retriever, "search_kwargs", {})
+
+    def invoke(self, query, config=None, **kwargs):
+        key = self.cache.key(query, {"search_type": getattr(self.retriever, "search_type", None), **self.search_kwargs})
+        hits = self.cache.get(key)
+        if hits is None:
+            hits = self._fetch(query)
+            self.cache.put(key, hits)
+        return [Document(id=hit.id, page_content=hit.page_content, metadata=dict(hit.metadata)) for hit in hits]
+
+    def _fetch(self, query):
+        if getattr(self.retriever, "search_type", None) == "similarity_score_threshold":
+            # Same search the retriever runs, but keeping the scores it would discard
+            scored = self.vectorstore.similarity_search_with_relevance_scores(query, **self.search_kwargs)
+        else:
+            scored = [(doc, None) for doc in self.retriever.invoke(query)]
+        return [CachedHit(doc.id, doc.page_content, dict(doc.metadata), score) for doc, score in scored]
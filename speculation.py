@@ -0,0 +1,59 @@
+import threading
+
+# "off": route, then retrieve. "retrieve": vector search runs while the router
+# decides. "grade": grading of the speculative results starts too.
+SPECULATION_MODES = ("off", "retrieve", "grade")
+# Speculative searches in flight per process; past this, questions route first
+DEFAULT_MAX_SPECULATIONS = 4
+
+class SpeculationStats:
+    """Process-wide tally of speculative retrieval that was used or thrown away."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.used = 0
+        self.discarded = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.wasted_retrievals = 0
+        self.wasted_grading_calls = 0
+        self.overlap_seconds = 0.0
+
+    def record_used(self, overlap_seconds) -> None:
+        with self._lock:
+            self.requests += 1
+            self.used += 1
+            self.overlap_seconds += overlap_seconds
+
+    def record_discarded(self, cancelled) -> None:
+        """Router chose not to retrieve; cancelled means the speculative work never started."""
+        with self._lock:
+            self.requests += 1
+            self.discarded += 1
+            self.cancelled += bool(cancelled)
+
+    def record_skipped(self) -> None:
+        """Every speculation slot was busy, so the question routed first."""
+        with self._lock:
+            self.requests += 1
+            self.skipped += 1
+
+    def record_waste(self, retrievals, grading_calls) -> None:
+        with self._lock:
+            self.wasted_retrievals += retrievals
+            self.wasted_grading_calls += grading_calls
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "used": self.used,
+                "discarded": self.discarded,
+                "cancelled": self.cancelled,
+                "skipped": self.skipped,
+                "wasted_retrievals": self.wasted_retrievals,
+                "wasted_grading_calls": self.wasted_grading_calls,
+                # Serial time taken off the critical path by overlapping retrieval with routing
+                "avg_overlap_seconds": self.overlap_seconds / self.used if self.used else 0.0,
+            }
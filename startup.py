@@ -0,0 +1,51 @@
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Imported lazily by the chat page; together they take a few seconds cold
+HEAVY_MODULES = ("langchain_openai", "langchain_astradb", "astrapy", "langgraph.graph")
+
+_timings = {}
+_lock = threading.Lock()
+_warm_thread = None
+
+@contextmanager
+def timed(label):
+    """Record how long the first run of a startup step took in this process."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            first = label not in _timings
+            if first:
+                _timings[label] = elapsed
+        if first:
+            logger.info("Startup: %s took %.2fs", label, elapsed)
+
+def warm_imports(modules=HEAVY_MODULES) -> None:
+    """Start importing the heavy modules on a background thread, once per process."""
+    global _warm_thread
+    with _lock:
+        if _warm_thread is not None:
+            return
+        _warm_thread = threading.Thread(target=_import_all, args=(modules,), name="warm-imports", daemon=True)
+    _warm_thread.start()
+
+def _import_all(modules):
+    for module in modules:
+        with timed(f"import {module}"):
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                logger.warning("Background import of %s failed: %s", module, e)
+
+def startup_report() -> dict:
+    """First-run durations in seconds, keyed by step, in the order they finished."""
+    with _lock:
+        return dict(_timings)
@@ -0,0 +1,28 @@
+from langchain_core.documents import Document
+
+from context_packer import pack_context
+
+PDF = "https://example.org/bco.pdf"
+
+def chunk(page, text):
+    return Document(page_content=text, metadata={"author": PDF, "title": "Book of Church Order", "page": page})
+
+def test_citation_lines_survive_packing():
+    documents = [
+        chunk(3, "BCO 13-6\nThe Presbytery shall examine candidates for ordination.\nPage 3"),
+        chunk(4, "BCO 14-1\nThe General Assembly is the highest court of this Church.\nPage 4"),
+    ]
+    context = pack_context(documents)
+    assert "BCO 13-6" in context
+    assert "BCO 14-1" in context
+    assert "Page 3" not in context
+
+def test_running_header_on_three_pages_is_stripped():
+    documents = [
+        chunk(page, f"The Book of Church Order\nSection {page} covers the courts of the Church.\nPage {page} of 40")
+        for page in (3, 4, 5)
+    ]
+    context = pack_context(documents)
+    assert "The Book of Church Order" not in context
+    assert all(f"Section {page} covers" in context for page in (3, 4, 5))
+    assert "of 40" not in context
@@ -0,0 +1,32 @@
+import pytest
+from langchain_core.documents import Document
+
+from ingest import LocalVectorStore, clean_pages, ingest
+
+def test_pages_differing_only_in_numbers_are_kept():
+    pages = [f"CHAPTER {n}\nThe session shall consist of elders number {n} and deacons.\n{n}" for n in range(1, 5)]
+    cleaned = clean_pages(pages)
+    assert all(f"CHAPTER {n}" in text and f"number {n} and deacons" in text for n, text in zip(range(1, 5), cleaned))
+    assert all(not text.endswith(f"\n{n}") for n, text in zip(range(1, 5), cleaned))
+
+def test_running_header_is_removed_but_citations_kept():
+    pages = [
+        f"Book of Church Order\nBCO 13-6\nThe Presbytery examines candidate {n}.\nPage {n} of 4"
+        for n in range(1, 5)
+    ]
+    cleaned = clean_pages(pages)
+    assert all("Book of Church Order" not in text for text in cleaned)
+    assert all("BCO 13-6" in text for text in cleaned)
+    assert all("Page" not in text for text in cleaned)
+
+def test_first_run_refuses_a_store_it_did_not_write(tmp_path):
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    catalog = tmp_path / "catalog.csv"
+    catalog.write_text("file_path,status,pdf_url,title\na.pdf,downloaded,https://example.org/a.pdf,A\n")
+    store = LocalVectorStore(str(tmp_path / "chunks.jsonl"))
+    store.add_documents([Document(page_content="loaded by hand", metadata={})], ids=["by-hand"])
+
+    with pytest.raises(SystemExit, match="--reset"):
+        ingest(store, str(catalog), str(tmp_path), str(tmp_path / "manifest.json"), "local")
+    assert list(store.records) == ["by-hand"]
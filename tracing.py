@@ -0,0 +1,153 @@
+import logging
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_PATH = "traces.sqlite3"
+PERCENTILES = (0.5, 0.95, 0.99)
+
+# Set while a traced node runs; LangChain attaches it to every LLM call made in that context
+_node_usage: ContextVar = ContextVar("node_usage", default=None)
+register_configure_hook(_node_usage, inheritable=True)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS node_spans (
+    request_id TEXT,
+    node TEXT,
+    started_at REAL,
+    wall_ms REAL,
+    llm_calls INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    docs_in INTEGER,
+    docs_out INTEGER,
+    error TEXT
+)
+"""
+
+class NodeUsage(BaseCallbackHandler):
+    """Counts LLM calls and tokens made while one node runs, including from worker threads."""
+
+    def __init__(self):
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+
+    def on_llm_end(self, response, **kwargs):
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+class TraceSink:
+    """Per-node spans in a local SQLite file, shared by every session in the process."""
+
+    def __init__(self, path=DEFAULT_TRACE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS node_spans_started ON node_spans (started_at)")
+        self._conn.commit()
+
+    def record(self, span: dict) -> None:
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO node_spans VALUES (:request_id, :node, :started_at, :wall_ms, :llm_calls, "
+                    ":prompt_tokens, :completion_tokens, :docs_in, :docs_out, :error)",
+                    span,
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            # Tracing must never fail a request
+            logger.warning("Could not record trace span for %s: %s", span.get("node"), e)
+
+    def spans(self, since=0.0):
+        """Spans started at or after `since` (epoch seconds) as a DataFrame, oldest first."""
+        import pandas as pd
+        with self._lock:
+            return pd.read_sql_query(
+                "SELECT * FROM node_spans WHERE started_at >= ? ORDER BY started_at", self._conn, params=(since,)
+            )
+
+    def node_summary(self, since=0.0):
+        """Per-node call counts, wall-time percentiles and mean LLM usage."""
+        spans = self.spans(since)
+        if spans.empty:
+            return spans
+        grouped = spans.groupby("node")
+        summary = grouped["wall_ms"].quantile(list(PERCENTILES)).unstack()
+        summary.columns = [f"p{int(q * 100)} ms" for q in PERCENTILES]
+        summary.insert(0, "calls", grouped.size())
+        summary["errors"] = grouped["error"].count()
+        summary["avg LLM calls"] = grouped["llm_calls"].mean()
+        summary["avg prompt tokens"] = grouped["prompt_tokens"].mean()
+        summary["avg completion tokens"] = grouped["completion_tokens"].mean()
+        summary["avg docs in"] = grouped["docs_in"].mean()
+        summary["avg docs out"] = grouped["docs_out"].mean()
+        return summary.sort_values("p50 ms", ascending=False)
+
+def _doc_count(state):
+    documents = state.get("documents") if isinstance(state, dict) else None
+    return len(documents) if documents is not None else None
+
+def traced(node, fn, sink: TraceSink):
+    """Wrap a graph node so each run writes one span to sink."""
+
+    def run(state):
+        usage = NodeUsage()
+        token = _node_usage.set(usage)
+        started_at = time.time()
+        start = time.perf_counter()
+        update, error = None, None
+        try:
+            update = fn(state)
+            return update
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _node_usage.reset(token)
+            docs_out = _doc_count(update)
+            sink.record({
+                "request_id": state.get("request_id", ""),
+                "node": node,
+                "started_at": started_at,
+                "wall_ms": (time.perf_counter() - start) * 1000,
+                "llm_calls": usage.llm_calls,
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "docs_in": _doc_count(state),
+                "docs_out": docs_out,
+                "error": error,
+            })
+
+    return run